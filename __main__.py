@@ -9,17 +9,27 @@ from identity_pool_policy import (
 from pulumi.resource import ResourceOptions
 from pulumi_aws import cognito, config, iam
 from pulumi_aws.get_caller_identity import get_caller_identity
+from sessionization_job import SessionizationJob
 
 """
 This is an example Pulumi program which creates a Nuage Analytics pipeline component,
 as well as a Cognito Identity Pool which allows anonymous authentication.  The pipeline
 creates a GTM tag and a variable called `search_field` in order to power the example
 website in the `example` folder.
+
+If the `pandas_layer_arn` config value is set, a scheduled sessionization job is also
+created, with a funnel from a page view to the example website's search event.  If the
+`replica_region` config value is set, its tables are replicated to that region.  If
+the `should_encrypt` config value is `true`, the bucket is encrypted with a KMS key.
 """
 
 
 analytics = Analytics(
-    "MyAnalytics", site_name="MyAnalyticsExampleSite", site_url="http://example.com"
+    "MyAnalytics",
+    site_name="MyAnalyticsExampleSite",
+    site_url="http://example.com",
+    replica_region=pulumi.Config().get("replica_region"),
+    should_encrypt=pulumi.Config().get_bool("should_encrypt") or False,
 )
 
 identity_pool = cognito.IdentityPool(
@@ -50,6 +60,25 @@ cognito.IdentityPoolRoleAttachment(
     roles={"unauthenticated": unauthenticated_role.arn},
 )
 
+pandas_layer_arn = pulumi.Config().get("pandas_layer_arn")
+
+if pandas_layer_arn is not None:
+    sessionization_job = SessionizationJob(
+        "MyAnalyticsSessionization",
+        bucket_name=analytics.bucket_name,
+        layers=[pandas_layer_arn],
+        funnel_steps=[
+            {"name": "Pageview", "analytics_event": "gtm.js"},
+            {"name": "Search", "analytics_event": "search"},
+        ],
+        kms_key_arn=analytics.kms_key_arn,
+        opts=ResourceOptions(depends_on=[analytics]),
+    )
+
+    pulumi.export("sessionization_function_name", sessionization_job.function_name)
+    pulumi.export("sessions_prefix", sessionization_job.sessions_prefix)
+    pulumi.export("funnel_steps_prefix", sessionization_job.funnel_steps_prefix)
+
 pulumi.export("bucket_name", analytics.bucket_name)
 pulumi.export("delivery_stream_name", analytics.delivery_stream_name)
 pulumi.export("delivery_stream_arn", analytics.destination_stream_arn)
@@ -60,3 +89,6 @@ pulumi.export("gtm_tag", analytics.gtm_tag)
 pulumi.export("gtm_tag_no_script", analytics.gtm_tag_no_script)
 pulumi.export("amplify_tag_id", analytics.amplify_tag_id)
 pulumi.export("event_name", analytics.event_name)
+pulumi.export("replica_bucket_name", analytics.replica_bucket_name)
+pulumi.export("replica_glue_database_name", analytics.replica_glue_database_name)
+pulumi.export("kms_key_arn", analytics.kms_key_arn)
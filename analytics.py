@@ -1,20 +1,34 @@
 import json
+from functools import lru_cache
 
 import pulumi
+from bucket_encryption import BucketEncryption
 from delay_resource import Delay
+from encryption_policy import get_key_policy_document
 from firehose_policy import (
     get_firehose_role_policy_document,
     get_firehose_role_trust_policy_document,
 )
-from gtm_analytics import GtmAnalytics
+from lake_replica import LakeReplica
 from pinpoint_policy import (
     get_pinpoint_stream_role_policy_document,
     get_pinpoint_stream_role_trust_policy_document,
 )
 from pulumi.output import Input, Output
 from pulumi.resource import ResourceOptions
-from pulumi_aws import config, iam, kinesis, pinpoint, s3
+from pulumi_aws import Provider, config, iam, kinesis, kms, pinpoint, s3
 from pulumi_aws.get_caller_identity import get_caller_identity
+from stream_sketches import StreamSketches
+
+
+@lru_cache(maxsize=None)
+def get_account_id() -> str:
+    """
+    Looks up the AWS account ID once per program.  `get_caller_identity` is a
+    synchronous invoke which waits for all outstanding resource registrations, so
+    calling it for every component makes programs with many components quadratic.
+    """
+    return get_caller_identity().account_id
 
 
 class Analytics(pulumi.ComponentResource):
@@ -76,12 +90,44 @@ class Analytics(pulumi.ComponentResource):
     The name of the GTM event trigger which will cause the Amplify tag to fire
     """
 
+    sketch_function_name: Output[str]
+    """
+    The name of the Firehose transform function which writes stream sketches
+    """
+
+    sketch_snapshot_prefix: Output[str]
+    """
+    The key prefix of the per-minute stream sketch snapshots in the bucket
+    """
+
+    replica_bucket_name: Output[str]
+    """
+    The name of the bucket in the replica region
+    """
+
+    replica_glue_database_name: Output[str]
+    """
+    The name of the Glue database of the replicated tables in the replica region
+    """
+
+    kms_key_arn: Output[str]
+    """
+    The ARN of the KMS key which encrypts the bucket
+    """
+
     def __init__(
         self,
         name,
         should_create_gtm_tag=True,
         site_name: Input[str] = None,
         site_url: Input[str] = None,
+        should_create_stream_sketches=False,
+        replica_region: str = None,
+        replica_account_id: str = None,
+        replica_provider: Provider = None,
+        replica_prefix: str = "sessionization/",
+        noncurrent_version_expiration_days: int = 30,
+        should_encrypt=False,
         opts=None,
     ):
         """
@@ -91,35 +137,128 @@ class Analytics(pulumi.ComponentResource):
                 `should_create_gtm_tag` is `True`, this is required.
         :param site_url: The website URL used for the Google Analytics property.  If
                 `should_create_gtm_tag` is `True`, this is required.
+        :param should_create_stream_sketches: Whether or not a Firehose transform
+                should be created which writes per-minute sketches of unique endpoints
+                and top pages and events into the bucket.
+        :param replica_region: If given, the sessionization job's tables are
+                replicated to a bucket in this region, with Glue tables for querying
+                them there.  This enables versioning on the bucket.
+        :param replica_account_id: The account in which to create the replica, if it
+                is not the current account.
+        :param replica_provider: The AWS provider for the replica region and account.
+                This is required if `replica_account_id` is given.
+        :param replica_prefix: The key prefix of the replicated tables.  This must be
+                the `output_prefix` of the `nuage:aws:SessionizationJob` which writes
+                them.
+        :param noncurrent_version_expiration_days: The number of days after which
+                overwritten and deleted versions of objects expire, in the bucket and
+                its replica, if `replica_region` is given.
+        :param should_encrypt: Whether or not the bucket should be encrypted with a
+                customer-managed KMS key, using an S3 Bucket Key so that KMS is not
+                called for every object, and the delivery stream with server-side
+                encryption.
         """
         super().__init__("nuage:aws:Analytics", name, None, opts)
 
-        account_id = get_caller_identity().account_id
+        account_id = get_account_id()
         region = config.region
 
-        bucket = s3.Bucket(f"{name}Bucket")
+        # The replication and the encryption are applied by `BucketReplication` and
+        # `BucketEncryption`, which a refresh of the bucket must not undo
+        ignored_bucket_changes = []
+        if replica_region is not None:
+            ignored_bucket_changes.append("replication_configuration")
+        if should_encrypt:
+            ignored_bucket_changes.append("server_side_encryption_configuration")
+
+        bucket = s3.Bucket(
+            f"{name}Bucket",
+            # Versioning is required on the source bucket of a replication
+            versioning={"enabled": True} if replica_region else None,
+            lifecycle_rules=[
+                {
+                    "enabled": True,
+                    "noncurrentVersionExpiration": {
+                        "days": noncurrent_version_expiration_days
+                    },
+                }
+            ]
+            if replica_region
+            else None,
+            opts=ResourceOptions(ignore_changes=ignored_bucket_changes),
+        )
+
+        kms_key = None
+        bucket_dependencies = [bucket]
+
+        if should_encrypt:
+            kms_key = kms.Key(
+                f"{name}Key",
+                description=f"Encrypts the {name} analytics bucket",
+                enable_key_rotation=True,
+                policy=get_key_policy_document(account_id).apply(json.dumps),
+            )
+
+            bucket_encryption = BucketEncryption(
+                f"{name}BucketEncryption",
+                bucket=bucket.id,
+                region=region,
+                kms_key_arn=kms_key.arn,
+            )
+            bucket_dependencies.append(bucket_encryption)
 
         firehose_role = iam.Role(
             f"{name}FirehoseRole",
             assume_role_policy=get_firehose_role_trust_policy_document(account_id),
         )
 
+        extended_s3_configuration = {
+            "bucketArn": bucket.arn,
+            "role_arn": firehose_role.arn,
+            "compressionFormat": "GZIP",
+        }
+        stream_sketches = None
+
+        if should_create_stream_sketches:
+            stream_sketches = StreamSketches(
+                f"{name}StreamSketches",
+                bucket.id,
+                kms_key_arn=kms_key.arn if kms_key else None,
+            )
+
+            extended_s3_configuration["processingConfiguration"] = {
+                "enabled": True,
+                "processors": [
+                    {
+                        "type": "Lambda",
+                        "parameters": [
+                            {
+                                "parameterName": "LambdaArn",
+                                "parameterValue": stream_sketches.processor_arn,
+                            }
+                        ],
+                    }
+                ],
+            }
+
         delivery_stream = kinesis.FirehoseDeliveryStream(
             f"{name}DeliveryStream",
             destination="extended_s3",
-            extended_s3_configuration={
-                "bucketArn": bucket.arn,
-                "role_arn": firehose_role.arn,
-                "compressionFormat": "GZIP",
-            },
-            opts=ResourceOptions(depends_on=[bucket, firehose_role]),
+            extended_s3_configuration=extended_s3_configuration,
+            server_side_encryption={"enabled": True} if should_encrypt else None,
+            opts=ResourceOptions(depends_on=[*bucket_dependencies, firehose_role]),
         )
 
         firehose_role_policy = iam.RolePolicy(
             f"{name}DeliveryStreamPolicy",
             role=firehose_role.name,
             policy=get_firehose_role_policy_document(
-                region, account_id, bucket.arn, delivery_stream.name
+                region,
+                account_id,
+                bucket.arn,
+                delivery_stream.name,
+                stream_sketches.function_arn if stream_sketches else None,
+                kms_key.arn if kms_key else None,
             ).apply(json.dumps),
         )
 
@@ -141,9 +280,13 @@ class Analytics(pulumi.ComponentResource):
 
         # IAM roles can take time to propogate so we have to add an artificial delay
         pinpoint_stream_role_delay = Delay(
-            "EventStreamRoleDelay",
+            f"{name}EventStreamRoleDelay",
             10,
-            opts=ResourceOptions(depends_on=[pinpoint_stream_role_policy]),
+            opts=ResourceOptions(
+                depends_on=[pinpoint_stream_role_policy],
+                # The delay was named without the component name in earlier versions
+                aliases=[pulumi.Alias(name="EventStreamRoleDelay")],
+            ),
         )
 
         pinpoint_stream = pinpoint.EventStream(
@@ -167,8 +310,39 @@ class Analytics(pulumi.ComponentResource):
             "gtm_tag_no_script": None,
             "amplify_tag_id": None,
             "event_name": None,
+            "sketch_function_name": None,
+            "sketch_snapshot_prefix": None,
+            "replica_bucket_name": None,
+            "replica_glue_database_name": None,
+            "kms_key_arn": kms_key.arn if kms_key else None,
         }
 
+        if stream_sketches is not None:
+            outputs = {
+                **outputs,
+                "sketch_function_name": stream_sketches.function_name,
+                "sketch_snapshot_prefix": stream_sketches.snapshot_prefix,
+            }
+
+        if replica_region is not None:
+            replica = LakeReplica(
+                f"{name}Replica",
+                bucket.id,
+                bucket.arn,
+                replica_region,
+                prefix=replica_prefix,
+                noncurrent_version_expiration_days=noncurrent_version_expiration_days,
+                replica_account_id=replica_account_id,
+                replica_provider=replica_provider,
+                source_kms_key_arn=kms_key.arn if kms_key else None,
+            )
+
+            outputs = {
+                **outputs,
+                "replica_bucket_name": replica.replica_bucket_name,
+                "replica_glue_database_name": replica.glue_database_name,
+            }
+
         if should_create_gtm_tag:
 
             if site_name is None:
@@ -177,6 +351,10 @@ class Analytics(pulumi.ComponentResource):
             if site_url is None:
                 raise Exception("The site_url parameter is required for the GTM tag")
 
+            # The Tag Manager and Google Analytics providers are installed from local
+            # checkouts, so they are only needed by programs which create the tag
+            from gtm_analytics import GtmAnalytics
+
             gtm = GtmAnalytics(name, site_name, site_url)
 
             outputs = {
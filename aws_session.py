@@ -0,0 +1,50 @@
+"""
+Credentials for the dynamic resources which call AWS through boto3 rather than
+through the `aws` provider.
+"""
+
+from typing import Optional
+
+import pulumi
+
+
+def get_provider_settings() -> dict:
+    """ Returns the profile and the role to assume from the stack's `aws`
+        configuration, which `create_session` uses in the same way as the `aws`
+        provider.  No other provider setting is honoured.
+    """
+    aws_config = pulumi.Config("aws")
+    return {
+        "profile": aws_config.get("profile"),
+        "assume_role": aws_config.get_object("assumeRole"),
+    }
+
+
+def create_session(region: str, settings: Optional[dict]):
+    """ Returns a boto3 session in `region`, with the credentials of the profile in
+        `settings`, or of the environment if there is none.  If `settings` has a role
+        to assume, the session uses the role's temporary credentials instead.
+    """
+    import boto3
+
+    settings = settings or {}
+    session = boto3.Session(profile_name=settings.get("profile"), region_name=region)
+
+    assume_role = settings.get("assume_role") or {}
+    if not assume_role.get("roleArn"):
+        return session
+
+    parameters = {
+        "RoleArn": assume_role["roleArn"],
+        "RoleSessionName": assume_role.get("sessionName") or "pulumi",
+    }
+    if assume_role.get("externalId"):
+        parameters["ExternalId"] = assume_role["externalId"]
+    credentials = session.client("sts").assume_role(**parameters)["Credentials"]
+
+    return boto3.Session(
+        aws_access_key_id=credentials["AccessKeyId"],
+        aws_secret_access_key=credentials["SecretAccessKey"],
+        aws_session_token=credentials["SessionToken"],
+        region_name=region,
+    )
@@ -0,0 +1,102 @@
+from typing import Optional
+
+from aws_session import create_session, get_provider_settings
+from pulumi.dynamic import (
+    CreateResult,
+    DiffResult,
+    Resource,
+    ResourceProvider,
+    UpdateResult,
+)
+from pulumi.output import Input
+from pulumi.resource import ResourceOptions
+
+
+class BucketEncryption(Resource):
+    """
+    This is a Pulumi resource which sets the default encryption of an existing S3
+    bucket to SSE-KMS with an S3 Bucket Key through the `PutBucketEncryption` API.
+    The `server_side_encryption_configuration` of `s3.Bucket` cannot enable Bucket
+    Keys, without which S3 calls KMS for every object written or read:
+
+    ```python
+    encryption = BucketEncryption("MyEncryption",
+        bucket=bucket.id,
+        region="eu-west-1",
+        kms_key_arn=key.arn,
+    )
+    ```
+
+    The bucket should ignore changes to its `server_side_encryption_configuration`.
+
+    The API is called with boto3, using the `profile` and `assumeRole` of the stack's
+    `aws` configuration, or else the credentials of the environment.  Other provider
+    settings, and the provider given in the resource options, are ignored.  There is
+    no `read`, so a refresh does not detect changes made outside of Pulumi.
+    """
+
+    def __init__(
+        self,
+        resource_name: str,
+        bucket: Input[str],
+        region: Input[str],
+        kms_key_arn: Input[str],
+        opts: Optional[ResourceOptions] = None,
+    ):
+        super().__init__(
+            BucketEncryptionProvider(resource_name),
+            resource_name,
+            {
+                "bucket": bucket,
+                "region": region,
+                "kms_key_arn": kms_key_arn,
+                "provider_settings": get_provider_settings(),
+            },
+            opts,
+        )
+
+
+class BucketEncryptionProvider(ResourceProvider):
+    def __init__(self, resource_name):
+        self.resource_name = resource_name
+
+    def put_encryption(self, inputs):
+        session = create_session(inputs["region"], inputs.get("provider_settings"))
+        session.client("s3").put_bucket_encryption(
+            Bucket=inputs["bucket"],
+            ServerSideEncryptionConfiguration={
+                "Rules": [
+                    {
+                        "ApplyServerSideEncryptionByDefault": {
+                            "SSEAlgorithm": "aws:kms",
+                            "KMSMasterKeyID": inputs["kms_key_arn"],
+                        },
+                        "BucketKeyEnabled": True,
+                    }
+                ]
+            },
+        )
+
+    def diff(self, _id, olds, news):
+        changed = [
+            key
+            for key in ["bucket", "region", "kms_key_arn", "provider_settings"]
+            if olds.get(key) != news.get(key)
+        ]
+        # Moving the configuration to another bucket must remove it from the old one
+        replaces = [key for key in changed if key in ["bucket", "region"]]
+        return DiffResult(
+            changes=bool(changed), replaces=replaces, delete_before_replace=True
+        )
+
+    def create(self, inputs):
+        self.put_encryption(inputs)
+        return CreateResult(f"{self.resource_name}-{inputs['bucket']}", inputs)
+
+    def update(self, _id, _olds, news):
+        self.put_encryption(news)
+        return UpdateResult(news)
+
+    def delete(self, _id, props):
+        session = create_session(props["region"], props.get("provider_settings"))
+        session.client("s3").delete_bucket_encryption(Bucket=props["bucket"])
@@ -0,0 +1,98 @@
+from typing import Optional
+
+from aws_session import create_session, get_provider_settings
+from pulumi.dynamic import (
+    CreateResult,
+    DiffResult,
+    Resource,
+    ResourceProvider,
+    UpdateResult,
+)
+from pulumi.output import Input
+from pulumi.resource import ResourceOptions
+
+
+class BucketReplication(Resource):
+    """
+    This is a Pulumi resource which sets the replication configuration of an existing
+    S3 bucket through the `PutBucketReplication` API.  The `replication_configuration`
+    of `s3.Bucket` does not support Replication Time Control, which guarantees that
+    replicas arrive within 15 minutes, so the configuration is applied directly:
+
+    ```python
+    replication = BucketReplication("MyReplication",
+        bucket=bucket.id,
+        region="eu-west-1",
+        replication_configuration=get_replication_configuration(...),
+        opts=ResourceOptions(depends_on=[replication_role_policy, replica_bucket])
+    )
+    ```
+
+    The source bucket must have versioning enabled.
+
+    The API is called with boto3, using the `profile` and `assumeRole` of the stack's
+    `aws` configuration, or else the credentials of the environment.  Other provider
+    settings, and the provider given in the resource options, are ignored.  There is
+    no `read`, so a refresh does not detect changes made outside of Pulumi.
+    """
+
+    def __init__(
+        self,
+        resource_name: str,
+        bucket: Input[str],
+        region: Input[str],
+        replication_configuration: Input[dict],
+        opts: Optional[ResourceOptions] = None,
+    ):
+        super().__init__(
+            BucketReplicationProvider(resource_name),
+            resource_name,
+            {
+                "bucket": bucket,
+                "region": region,
+                "replication_configuration": replication_configuration,
+                "provider_settings": get_provider_settings(),
+            },
+            opts,
+        )
+
+
+class BucketReplicationProvider(ResourceProvider):
+    def __init__(self, resource_name):
+        self.resource_name = resource_name
+
+    def put_replication(self, inputs):
+        session = create_session(inputs["region"], inputs.get("provider_settings"))
+        session.client("s3").put_bucket_replication(
+            Bucket=inputs["bucket"],
+            ReplicationConfiguration=inputs["replication_configuration"],
+        )
+
+    def diff(self, _id, olds, news):
+        changed = [
+            key
+            for key in [
+                "bucket",
+                "region",
+                "replication_configuration",
+                "provider_settings",
+            ]
+            if olds.get(key) != news.get(key)
+        ]
+        # Moving the configuration to another bucket must remove it from the old one
+        replaces = [key for key in changed if key in ["bucket", "region"]]
+        return DiffResult(
+            changes=bool(changed), replaces=replaces, delete_before_replace=True
+        )
+
+    def create(self, inputs):
+        self.put_replication(inputs)
+        return CreateResult(f"{self.resource_name}-{inputs['bucket']}", inputs)
+
+    def update(self, _id, _olds, news):
+        self.put_replication(news)
+        return UpdateResult(news)
+
+    def delete(self, _id, props):
+        session = create_session(props["region"], props.get("provider_settings"))
+        session.client("s3").delete_bucket_replication(Bucket=props["bucket"])
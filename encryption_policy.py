@@ -0,0 +1,87 @@
+from typing import List, Optional
+
+from pulumi.output import Input, Output
+
+KEY_USER_ACTIONS = [
+    "kms:Encrypt",
+    "kms:Decrypt",
+    "kms:ReEncrypt*",
+    "kms:GenerateDataKey*",
+    "kms:DescribeKey",
+]
+
+
+def get_key_policy_document(
+    account_id: Input[str],
+    key_user_arn: Optional[Output[str]] = None,
+    region: Optional[str] = None,
+):
+    """ Returns the policy of a customer-managed key which delegates access to the key
+        to the IAM policies of `account_id`, so that each role is granted only the
+        KMS actions it needs in its own policy.
+
+        account_id -- The account which owns the key, as a string or a Pulumi Output
+        key_user_arn -- The ARN of a role in another account which may use the key
+                through S3 in `region`, as a Pulumi Output
+        region -- The region of the key
+    """
+    return Output.all(account_id, key_user_arn).apply(
+        lambda outputs: {
+            "Version": "2012-10-17",
+            "Statement": [
+                {
+                    "Sid": "EnableIamPolicies",
+                    "Effect": "Allow",
+                    "Principal": {"AWS": f"arn:aws:iam::{outputs[0]}:root"},
+                    "Action": "kms:*",
+                    "Resource": "*",
+                }
+            ]
+            + (
+                []
+                if outputs[1] is None
+                else [
+                    {
+                        "Sid": "AllowUseThroughS3",
+                        "Effect": "Allow",
+                        "Principal": {"AWS": outputs[1]},
+                        "Action": KEY_USER_ACTIONS,
+                        "Resource": "*",
+                        "Condition": {
+                            "StringEquals": {
+                                "kms:ViaService": f"s3.{region}.amazonaws.com"
+                            }
+                        },
+                    }
+                ]
+            ),
+        }
+    )
+
+
+def get_bucket_key_policy_statement(
+    region: str, key_arn: str, bucket_arn: str, actions: List[str]
+):
+    """ Returns a policy statement granting `actions` on the bucket's key, only when
+        they are made by S3 on behalf of objects in the bucket.
+
+        With S3 Bucket Keys enabled the encryption context is the bucket ARN rather
+        than the object ARN, so a request which would bypass the bucket key, and make
+        a KMS call per object, is denied rather than silently billed.
+
+        region -- The region of the bucket
+        key_arn -- The ARN of the bucket's KMS key
+        bucket_arn -- The ARN of the bucket
+        actions -- The KMS actions to grant
+    """
+    return {
+        "Effect": "Allow",
+        "Action": actions,
+        "Resource": [key_arn],
+        "Condition": {
+            "StringEquals": {
+                "kms:ViaService": f"s3.{region}.amazonaws.com",
+                "kms:EncryptionContext:aws:s3:arn": bucket_arn,
+            }
+        },
+    }
@@ -1,4 +1,5 @@
 import pulumi
+from encryption_policy import get_bucket_key_policy_statement
 
 
 def get_firehose_role_trust_policy_document(accountId):
@@ -32,7 +33,12 @@ def apply_firehose_role_policy_document_outputs(bucketArn, deliveryStreamName, f
 
 
 def get_firehose_role_policy_document(
-    region, accountId, bucketArnOutput, deliveryStreamNameOutput
+    region,
+    accountId,
+    bucketArnOutput,
+    deliveryStreamNameOutput,
+    processorFunctionArnOutput=None,
+    kmsKeyArnOutput=None,
 ):
     """ Returns a role permitting Firehose to read Dynamo tables and write to S3
 
@@ -40,8 +46,12 @@ def get_firehose_role_policy_document(
         accountID -- The AWS account ID as a string
         bucketArnOutput -- The destination bucket ARN as a Pulumi Output
         deliveryStreamNameOutput -- The name of the Firehose delivery stream as a Pulumi Output
+        processorFunctionArnOutput -- The ARN of an optional transform Lambda function
+            as a Pulumi Output
+        kmsKeyArnOutput -- The ARN of the bucket's KMS key as a Pulumi Output, if the
+            bucket is encrypted
     """
-    return apply_firehose_role_policy_document_outputs(
+    document = apply_firehose_role_policy_document_outputs(
         bucketArnOutput,
         deliveryStreamNameOutput,
         lambda bucketArn, deliveryStreamName: {
@@ -91,3 +101,45 @@ def get_firehose_role_policy_document(
             ],
         },
     )
+
+    if processorFunctionArnOutput is not None:
+        document = pulumi.Output.all(document, processorFunctionArnOutput).apply(
+            lambda outputs: {
+                **outputs[0],
+                "Statement": outputs[0]["Statement"]
+                + [
+                    {
+                        "Sid": "",
+                        "Effect": "Allow",
+                        "Action": [
+                            "lambda:InvokeFunction",
+                            "lambda:GetFunctionConfiguration",
+                        ],
+                        "Resource": [outputs[1], f"{outputs[1]}:*"],
+                    }
+                ],
+            }
+        )
+
+    if kmsKeyArnOutput is None:
+        return document
+
+    # Firehose writes with the bucket's default encryption, so its objects use the
+    # bucket key and it needs no key of its own in `extended_s3_configuration`
+    return pulumi.Output.all(document, kmsKeyArnOutput, bucketArnOutput).apply(
+        lambda outputs: {
+            **outputs[0],
+            "Statement": outputs[0]["Statement"]
+            + [
+                {
+                    "Sid": "",
+                    **get_bucket_key_policy_statement(
+                        region,
+                        outputs[1],
+                        outputs[2],
+                        ["kms:Decrypt", "kms:GenerateDataKey"],
+                    ),
+                }
+            ],
+        }
+    )
@@ -0,0 +1,322 @@
+import json
+from typing import List, Optional, Tuple
+
+import pulumi
+import pulumi_aws
+from bucket_replication import BucketReplication
+from encryption_policy import get_key_policy_document
+from pulumi.output import Input, Output
+from pulumi.resource import ResourceOptions
+from pulumi_aws import config, glue, iam, kms, s3
+from replication_policy import (
+    get_replica_bucket_policy_document,
+    get_replication_configuration,
+    get_replication_role_key_policy_document,
+    get_replication_role_policy_document,
+    get_replication_role_trust_policy_document,
+)
+
+# The Parquet schemas written by the sessionization job in `sessionizer.py`
+SESSION_COLUMNS = [
+    ("session_id", "string"),
+    ("endpoint_id", "string"),
+    ("session_start", "timestamp"),
+    ("session_end", "timestamp"),
+    ("event_count", "bigint"),
+    ("landing_page", "string"),
+    ("exit_page", "string"),
+    ("referrer", "string"),
+    ("duration_seconds", "double"),
+]
+
+FUNNEL_STEP_COLUMNS = [
+    ("session_id", "string"),
+    ("endpoint_id", "string"),
+    ("step_index", "bigint"),
+    ("step_name", "string"),
+    ("reached_at", "timestamp"),
+]
+
+
+class LakeReplica(pulumi.ComponentResource):
+    """
+    The `nuage:aws:LakeReplica` component replicates the compacted, partitioned
+    session and funnel-step tables written by the sessionization job into a bucket in
+    another region, and optionally another account, so that analysts there can query
+    them without cross-region transfer.  Replication Time Control is enabled, and a
+    Glue database with partition-projected tables is created next to the replica.
+
+    The raw hourly Firehose objects are not replicated.  The analytics bucket must
+    have versioning enabled.  If it is encrypted with KMS, the replica bucket is
+    encrypted with a key of its own in the replica region.
+    """
+
+    replica_bucket_name: Output[str]
+    """
+    The name of the bucket in the replica region
+    """
+
+    replication_role_arn: Output[str]
+    """
+    The ARN of the IAM role which S3 assumes to replicate objects
+    """
+
+    glue_database_name: Output[str]
+    """
+    The name of the Glue database in the replica region
+    """
+
+    sessions_table_name: Output[str]
+    """
+    The name of the Glue table of sessions in the replica region
+    """
+
+    funnel_steps_table_name: Output[str]
+    """
+    The name of the Glue table of funnel steps in the replica region
+    """
+
+    def __init__(
+        self,
+        name: str,
+        source_bucket_name: Input[str],
+        source_bucket_arn: Input[str],
+        replica_region: str,
+        prefix: str = "sessionization/",
+        noncurrent_version_expiration_days: int = 30,
+        replica_account_id: Optional[str] = None,
+        replica_provider: Optional[pulumi_aws.Provider] = None,
+        source_kms_key_arn: Optional[Input[str]] = None,
+        opts=None,
+    ):
+        """
+        :param source_bucket_name: The name of the versioned analytics bucket.
+        :param source_bucket_arn: The ARN of the versioned analytics bucket.
+        :param replica_region: The region in which to create the replica.
+        :param prefix: The key prefix of the sessionization job's output tables, which
+                is the `output_prefix` of the `nuage:aws:SessionizationJob`.  Only the
+                tables are replicated, not the job's state.
+        :param noncurrent_version_expiration_days: The number of days after which
+                overwritten and deleted versions of the replicas expire.  The same
+                expiration should be set on the versioned analytics bucket.
+        :param replica_account_id: The account in which to create the replica, if it
+                is not the account of the analytics bucket.  `replica_provider` must
+                then be given with credentials for that account.
+        :param replica_provider: The AWS provider used to create resources in the
+                replica region.  If not given, one is created for `replica_region`.
+        :param source_kms_key_arn: The ARN of the analytics bucket's KMS key, if the
+                bucket is encrypted.
+        """
+        super().__init__("nuage:aws:LakeReplica", name, None, opts)
+
+        sessions_prefix = f"{prefix}sessions/"
+        funnel_steps_prefix = f"{prefix}funnel_steps/"
+        table_prefixes = [sessions_prefix, funnel_steps_prefix]
+
+        if replica_account_id is not None and replica_provider is None:
+            raise Exception(
+                "The replica_provider parameter is required for a cross-account replica"
+            )
+
+        if replica_provider is None:
+            replica_provider = pulumi_aws.Provider(
+                f"{name}Provider", region=replica_region
+            )
+
+        replica_opts = ResourceOptions(provider=replica_provider)
+
+        replication_role = iam.Role(
+            f"{name}ReplicationRole",
+            assume_role_policy=get_replication_role_trust_policy_document(),
+        )
+
+        replica_key = None
+        server_side_encryption_configuration = None
+
+        if source_kms_key_arn is not None:
+            replica_key = kms.Key(
+                f"{name}Key",
+                description=f"Encrypts the {name} replica of the analytics tables",
+                enable_key_rotation=True,
+                policy=get_key_policy_document(
+                    # A same-account replica is owned by the account of the source key
+                    replica_account_id
+                    or Output.from_input(source_kms_key_arn).apply(
+                        lambda arn: arn.split(":")[4]
+                    ),
+                    replication_role.arn if replica_account_id else None,
+                    replica_region,
+                ).apply(json.dumps),
+                opts=replica_opts,
+            )
+
+            # The replicas are a few compacted objects an hour, so unlike the
+            # analytics bucket the replica bucket does not need an S3 Bucket Key
+            server_side_encryption_configuration = {
+                "rule": {
+                    "applyServerSideEncryptionByDefault": {
+                        "sseAlgorithm": "aws:kms",
+                        "kmsMasterKeyId": replica_key.arn,
+                    }
+                }
+            }
+
+        replica_bucket = s3.Bucket(
+            f"{name}Bucket",
+            versioning={"enabled": True},
+            lifecycle_rules=[
+                {
+                    "enabled": True,
+                    "noncurrentVersionExpiration": {
+                        "days": noncurrent_version_expiration_days
+                    },
+                }
+            ],
+            server_side_encryption_configuration=server_side_encryption_configuration,
+            opts=replica_opts,
+        )
+
+        replication_role_policy = iam.RolePolicy(
+            f"{name}ReplicationPolicy",
+            role=replication_role.name,
+            policy=get_replication_role_policy_document(
+                source_bucket_arn,
+                replica_bucket.arn,
+                table_prefixes,
+                replica_account_id,
+            ).apply(json.dumps),
+        )
+
+        replication_dependencies = [replication_role_policy, replica_bucket]
+
+        if replica_key is not None:
+            replication_role_key_policy = iam.RolePolicy(
+                f"{name}ReplicationKeyPolicy",
+                role=replication_role.name,
+                policy=get_replication_role_key_policy_document(
+                    config.region,
+                    source_bucket_arn,
+                    source_kms_key_arn,
+                    replica_region,
+                    replica_bucket.arn,
+                    replica_key.arn,
+                    table_prefixes,
+                ).apply(json.dumps),
+            )
+            replication_dependencies.append(replication_role_key_policy)
+
+        if replica_account_id is not None:
+            replica_bucket_policy = s3.BucketPolicy(
+                f"{name}BucketPolicy",
+                bucket=replica_bucket.id,
+                policy=get_replica_bucket_policy_document(
+                    replica_bucket.arn, replication_role.arn, table_prefixes
+                ).apply(json.dumps),
+                opts=replica_opts,
+            )
+            replication_dependencies.append(replica_bucket_policy)
+
+        BucketReplication(
+            f"{name}Replication",
+            bucket=source_bucket_name,
+            region=config.region,
+            replication_configuration=get_replication_configuration(
+                replication_role.arn,
+                replica_bucket.arn,
+                table_prefixes,
+                replica_account_id,
+                replica_key_arn=replica_key.arn if replica_key else None,
+            ),
+            opts=ResourceOptions(depends_on=replication_dependencies),
+        )
+
+        database = glue.CatalogDatabase(
+            f"{name}Database", name=f"{name.lower()}_analytics", opts=replica_opts
+        )
+
+        sessions_table = self.create_table(
+            f"{name}SessionsTable",
+            "sessions",
+            database.name,
+            replica_bucket.id,
+            sessions_prefix,
+            SESSION_COLUMNS,
+            replica_opts,
+        )
+
+        funnel_steps_table = self.create_table(
+            f"{name}FunnelStepsTable",
+            "funnel_steps",
+            database.name,
+            replica_bucket.id,
+            funnel_steps_prefix,
+            FUNNEL_STEP_COLUMNS,
+            replica_opts,
+        )
+
+        outputs = {
+            "replica_bucket_name": replica_bucket.id,
+            "replication_role_arn": replication_role.arn,
+            "glue_database_name": database.name,
+            "sessions_table_name": sessions_table.name,
+            "funnel_steps_table_name": funnel_steps_table.name,
+        }
+
+        self.set_outputs(outputs)
+
+    def create_table(
+        self,
+        resource_name: str,
+        table_name: str,
+        database_name: Output[str],
+        bucket_name: Output[str],
+        prefix: str,
+        columns: List[Tuple[str, str]],
+        opts: ResourceOptions,
+    ):
+        """
+        Creates an external Parquet table partitioned by `dt`.  Partition projection
+        is used so that new daily partitions can be queried without a crawler.
+        """
+        location = bucket_name.apply(lambda bucket: f"s3://{bucket}/{prefix}")
+
+        return glue.CatalogTable(
+            resource_name,
+            name=table_name,
+            database_name=database_name,
+            table_type="EXTERNAL_TABLE",
+            parameters={
+                "EXTERNAL": "TRUE",
+                "classification": "parquet",
+                "projection.enabled": "true",
+                "projection.dt.type": "date",
+                "projection.dt.format": "yyyy-MM-dd",
+                "projection.dt.range": "2020-01-01,NOW",
+                "storage.location.template": location.apply(
+                    lambda url: url + "dt=${dt}/"
+                ),
+            },
+            partition_keys=[{"name": "dt", "type": "string"}],
+            storage_descriptor={
+                "location": location,
+                "inputFormat": "org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat",
+                "outputFormat": "org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat",
+                "serDeInfo": {
+                    "serializationLibrary": "org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe"
+                },
+                "columns": [
+                    {"name": column, "type": type_} for column, type_ in columns
+                ],
+            },
+            opts=opts,
+        )
+
+    def set_outputs(self, outputs: dict):
+        """
+        Adds the Pulumi outputs as attributes on the current object so they can be
+        used as outputs by the caller, as well as registering them.
+        """
+        for output_name in outputs.keys():
+            setattr(self, output_name, outputs[output_name])
+
+        self.register_outputs(outputs)
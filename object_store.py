@@ -0,0 +1,100 @@
+"""
+Stores used by the Lambda jobs to read and write objects in the analytics bucket, or in
+a local folder laid out in the same way when the jobs are run locally.
+"""
+
+import os
+from typing import List, Optional
+
+
+class S3Store:
+    """
+    Reads and writes objects in the analytics bucket.
+    """
+
+    def __init__(self, bucket_name: str, client=None):
+        if client is None:
+            import boto3
+
+            client = boto3.client("s3")
+
+        self.bucket_name = bucket_name
+        self.client = client
+
+    def list_keys(self, prefix: str) -> List[str]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        pages = paginator.paginate(Bucket=self.bucket_name, Prefix=prefix)
+        return sorted(obj["Key"] for page in pages for obj in page.get("Contents", []))
+
+    def list_prefixes(self, prefix: str) -> List[str]:
+        """ Returns the names of the "folders" immediately below the given prefix """
+        paginator = self.client.get_paginator("list_objects_v2")
+        pages = paginator.paginate(
+            Bucket=self.bucket_name, Prefix=prefix, Delimiter="/"
+        )
+        return sorted(
+            common["Prefix"].rstrip("/").rsplit("/", 1)[-1]
+            for page in pages
+            for common in page.get("CommonPrefixes", [])
+        )
+
+    def read(self, key: str) -> Optional[bytes]:
+        try:
+            return self.client.get_object(Bucket=self.bucket_name, Key=key)[
+                "Body"
+            ].read()
+        except self.client.exceptions.NoSuchKey:
+            return None
+
+    def write(self, key: str, body: bytes):
+        self.client.put_object(Bucket=self.bucket_name, Key=key, Body=body)
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket_name, Key=key)
+
+
+class LocalStore:
+    """
+    A folder on the local filesystem laid out in the same way as the analytics bucket.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def list_keys(self, prefix: str) -> List[str]:
+        keys = []
+        for directory, _, files in os.walk(self.root):
+            for file_name in files:
+                path = os.path.join(directory, file_name)
+                key = os.path.relpath(path, self.root).replace(os.sep, "/")
+                if key.startswith(prefix):
+                    keys.append(key)
+        return sorted(keys)
+
+    def list_prefixes(self, prefix: str) -> List[str]:
+        directory = os.path.join(self.root, prefix)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(
+            entry
+            for entry in os.listdir(directory)
+            if os.path.isdir(os.path.join(directory, entry))
+        )
+
+    def read(self, key: str) -> Optional[bytes]:
+        path = os.path.join(self.root, key)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def write(self, key: str, body: bytes):
+        path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(body)
+
+    def delete(self, key: str):
+        path = os.path.join(self.root, key)
+        if os.path.exists(path):
+            os.remove(path)
@@ -36,7 +36,17 @@ def get_pinpoint_stream_role_policy_document(
     delivery_stream_name: Output[str],
     pinpoint_application_id: Output[str],
 ):
+    """ Returns a policy permitting Pinpoint to stream events into the delivery stream.
 
+        No KMS permissions are needed when the delivery stream has server-side
+        encryption enabled, as Firehose encrypts the records it receives itself.
+
+        region -- The AWS region as a string
+        account_id -- The AWS account ID as a string
+        delivery_stream_name -- The name of the Firehose delivery stream as a Pulumi
+                Output
+        pinpoint_application_id -- The Pinpoint application ID as a Pulumi Output
+    """
     return apply_pinpoint_stream_role_policy_document_outputs(
         delivery_stream_name,
         pinpoint_application_id,
@@ -0,0 +1,240 @@
+from typing import List, Optional
+
+from encryption_policy import get_bucket_key_policy_statement
+from pulumi.output import Output
+
+
+def get_replication_role_trust_policy_document():
+    return {
+        "Version": "2012-10-17",
+        "Statement": [
+            {
+                "Effect": "Allow",
+                "Principal": {"Service": "s3.amazonaws.com"},
+                "Action": "sts:AssumeRole",
+            }
+        ],
+    }
+
+
+def apply_replication_policy_document_outputs(
+    source_bucket_arn, replica_bucket_arn, func
+):
+    """ Applies the Pulumi outputs `source_bucket_arn` and `replica_bucket_arn` to
+        the given function.
+
+        source_bucket_arn -- The analytics bucket ARN as a Pulumi Output
+        replica_bucket_arn -- The replica bucket ARN as a Pulumi Output
+        func -- A lambda function with inputs (source_bucket_arn: str,
+                replica_bucket_arn: str)
+    """
+    return Output.all(source_bucket_arn, replica_bucket_arn).apply(
+        lambda outputs: func(outputs[0], outputs[1])
+    )
+
+
+def get_replication_role_policy_document(
+    source_bucket_arn: Output[str],
+    replica_bucket_arn: Output[str],
+    prefixes: List[str],
+    replica_account_id: Optional[str] = None,
+):
+    """ Returns a policy permitting S3 to replicate objects under `prefixes` from the
+        analytics bucket to the replica bucket.
+
+        source_bucket_arn -- The analytics bucket ARN as a Pulumi Output
+        replica_bucket_arn -- The replica bucket ARN as a Pulumi Output
+        prefixes -- The key prefixes of the replicated objects
+        replica_account_id -- The account which owns the replica bucket, if it is
+                not the account of the analytics bucket
+    """
+    replicate_actions = ["s3:ReplicateObject", "s3:ReplicateDelete", "s3:ReplicateTags"]
+    if replica_account_id is not None:
+        replicate_actions.append("s3:ObjectOwnerOverrideToBucketOwner")
+
+    return apply_replication_policy_document_outputs(
+        source_bucket_arn,
+        replica_bucket_arn,
+        lambda source_arn, replica_arn: {
+            "Version": "2012-10-17",
+            "Statement": [
+                {
+                    "Effect": "Allow",
+                    "Action": ["s3:GetReplicationConfiguration", "s3:ListBucket"],
+                    "Resource": [source_arn],
+                },
+                {
+                    "Effect": "Allow",
+                    "Action": [
+                        "s3:GetObjectVersionForReplication",
+                        "s3:GetObjectVersionAcl",
+                        "s3:GetObjectVersionTagging",
+                    ],
+                    "Resource": [f"{source_arn}/{prefix}*" for prefix in prefixes],
+                },
+                {
+                    "Effect": "Allow",
+                    "Action": replicate_actions,
+                    "Resource": [f"{replica_arn}/{prefix}*" for prefix in prefixes],
+                },
+            ],
+        },
+    )
+
+
+def get_replication_role_key_policy_document(
+    source_region: str,
+    source_bucket_arn: Output[str],
+    source_key_arn: Output[str],
+    replica_region: str,
+    replica_bucket_arn: Output[str],
+    replica_key_arn: Output[str],
+    prefixes: List[str],
+):
+    """ Returns a policy permitting S3 to decrypt the objects under `prefixes` in the
+        encrypted analytics bucket, and to encrypt their replicas with the replica
+        bucket's key.
+
+        source_region -- The region of the analytics bucket
+        source_bucket_arn -- The analytics bucket ARN as a Pulumi Output
+        source_key_arn -- The ARN of the analytics bucket's key as a Pulumi Output
+        replica_region -- The region of the replica bucket
+        replica_bucket_arn -- The replica bucket ARN as a Pulumi Output
+        replica_key_arn -- The ARN of the replica bucket's key as a Pulumi Output
+        prefixes -- The key prefixes of the replicated objects
+    """
+    return Output.all(
+        source_bucket_arn, source_key_arn, replica_bucket_arn, replica_key_arn
+    ).apply(
+        lambda outputs: {
+            "Version": "2012-10-17",
+            "Statement": [
+                get_bucket_key_policy_statement(
+                    source_region, outputs[1], outputs[0], ["kms:Decrypt"]
+                ),
+                {
+                    "Effect": "Allow",
+                    "Action": ["kms:Encrypt"],
+                    "Resource": [outputs[3]],
+                    "Condition": {
+                        "StringEquals": {
+                            "kms:ViaService": f"s3.{replica_region}.amazonaws.com"
+                        },
+                        "StringLike": {
+                            "kms:EncryptionContext:aws:s3:arn": [
+                                f"{outputs[2]}/{prefix}*" for prefix in prefixes
+                            ]
+                        },
+                    },
+                },
+            ],
+        }
+    )
+
+
+def get_replica_bucket_policy_document(
+    replica_bucket_arn: Output[str],
+    replication_role_arn: Output[str],
+    prefixes: List[str],
+):
+    """ Returns a bucket policy permitting the replication role of another account
+        to replicate into the replica bucket, and to hand ownership of the replicas
+        to the replica account.
+
+        replica_bucket_arn -- The replica bucket ARN as a Pulumi Output
+        replication_role_arn -- The ARN of the replication role as a Pulumi Output
+        prefixes -- The key prefixes of the replicated objects
+    """
+    return Output.all(replica_bucket_arn, replication_role_arn).apply(
+        lambda outputs: {
+            "Version": "2012-10-17",
+            "Statement": [
+                {
+                    "Effect": "Allow",
+                    "Principal": {"AWS": outputs[1]},
+                    "Action": ["s3:GetBucketVersioning", "s3:PutBucketVersioning"],
+                    "Resource": [outputs[0]],
+                },
+                {
+                    "Effect": "Allow",
+                    "Principal": {"AWS": outputs[1]},
+                    "Action": [
+                        "s3:ReplicateObject",
+                        "s3:ReplicateDelete",
+                        "s3:ReplicateTags",
+                        "s3:ObjectOwnerOverrideToBucketOwner",
+                    ],
+                    "Resource": [f"{outputs[0]}/{prefix}*" for prefix in prefixes],
+                },
+            ],
+        }
+    )
+
+
+def get_replication_configuration(
+    replication_role_arn: Output[str],
+    replica_bucket_arn: Output[str],
+    prefixes: List[str],
+    replica_account_id: Optional[str] = None,
+    replication_time_minutes: int = 15,
+    replica_key_arn: Optional[Output[str]] = None,
+):
+    """ Returns the `ReplicationConfiguration` of the analytics bucket, in the form
+        taken by the S3 `PutBucketReplication` API.  Replication Time Control is
+        enabled so that replicas arrive within `replication_time_minutes`, with
+        replication metrics reported against the same threshold.  There is one rule
+        for each prefix.
+
+        replication_role_arn -- The ARN of the replication role as a Pulumi Output
+        replica_bucket_arn -- The replica bucket ARN as a Pulumi Output
+        prefixes -- The key prefixes of the replicated objects
+        replica_account_id -- The account which owns the replica bucket, if it is
+                not the account of the analytics bucket
+        replica_key_arn -- The ARN of the replica bucket's key as a Pulumi Output, if
+                the analytics bucket is encrypted.  Objects encrypted with KMS are
+                only replicated when this is given.
+    """
+
+    def get_destination(replica_arn, key_arn):
+        destination = {
+            "Bucket": replica_arn,
+            "ReplicationTime": {
+                "Status": "Enabled",
+                "Time": {"Minutes": replication_time_minutes},
+            },
+            "Metrics": {
+                "Status": "Enabled",
+                "EventThreshold": {"Minutes": replication_time_minutes},
+            },
+        }
+        if replica_account_id is not None:
+            destination["Account"] = replica_account_id
+            destination["AccessControlTranslation"] = {"Owner": "Destination"}
+        if key_arn is not None:
+            destination["EncryptionConfiguration"] = {"ReplicaKmsKeyID": key_arn}
+        return destination
+
+    def get_rule(index, prefix, replica_arn, key_arn):
+        rule = {
+            "ID": f"Replicate-{prefix.strip('/').replace('/', '-')}",
+            "Priority": index + 1,
+            "Status": "Enabled",
+            "Filter": {"Prefix": prefix},
+            "DeleteMarkerReplication": {"Status": "Disabled"},
+            "Destination": get_destination(replica_arn, key_arn),
+        }
+        if key_arn is not None:
+            rule["SourceSelectionCriteria"] = {
+                "SseKmsEncryptedObjects": {"Status": "Enabled"}
+            }
+        return rule
+
+    return Output.all(replication_role_arn, replica_bucket_arn, replica_key_arn).apply(
+        lambda outputs: {
+            "Role": outputs[0],
+            "Rules": [
+                get_rule(index, prefix, outputs[1], outputs[2])
+                for index, prefix in enumerate(prefixes)
+            ],
+        }
+    )
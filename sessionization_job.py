@@ -0,0 +1,171 @@
+import json
+import os
+from typing import List
+
+import pulumi
+from pulumi.output import Input, Output
+from pulumi.resource import ResourceOptions
+from pulumi_aws import cloudwatch, config, iam, lambda_
+from sessionization_policy import (
+    get_sessionization_role_policy_document,
+    get_sessionization_role_trust_policy_document,
+)
+
+SOURCE_DIR = os.path.dirname(__file__)
+
+# The modules packaged into the Lambda function
+JOB_MODULES = ["sessionizer.py", "object_store.py"]
+
+
+class SessionizationJob(pulumi.ComponentResource):
+    """
+    The `nuage:aws:SessionizationJob` component creates a scheduled Lambda function
+    which incrementally groups the events in an `nuage:aws:Analytics` bucket into
+    sessions, and writes session and funnel-step Parquet tables back into the bucket.
+    See `sessionizer.py` for the job itself.
+
+    The job uses pandas and pyarrow, which are not part of the Lambda Python runtime,
+    so a layer providing them (such as AWS Data Wrangler) must be passed in `layers`.
+    """
+
+    function_name: Output[str]
+    """
+    The name of the Lambda function which runs the sessionization job
+    """
+
+    function_arn: Output[str]
+    """
+    The ARN of the Lambda function which runs the sessionization job
+    """
+
+    schedule_rule_name: Output[str]
+    """
+    The name of the CloudWatch Events rule which triggers the job
+    """
+
+    sessions_prefix: Output[str]
+    """
+    The key prefix of the session table in the analytics bucket
+    """
+
+    funnel_steps_prefix: Output[str]
+    """
+    The key prefix of the funnel-step table in the analytics bucket
+    """
+
+    def __init__(
+        self,
+        name: str,
+        bucket_name: Input[str],
+        layers: List[Input[str]],
+        schedule_expression: str = "rate(1 hour)",
+        inactivity_gap_minutes: int = 30,
+        funnel_steps: List[dict] = None,
+        output_prefix: str = "sessionization/",
+        settle_minutes: int = 20,
+        max_partitions: int = 24,
+        kms_key_arn: Input[str] = None,
+        opts=None,
+    ):
+        """
+        :param bucket_name: The name of the analytics bucket, such as the
+                `bucket_name` output of `nuage:aws:Analytics`.
+        :param layers: Lambda layer ARNs which provide pandas and pyarrow.
+        :param schedule_expression: The CloudWatch Events schedule for the job.
+        :param inactivity_gap_minutes: A new session is started for an endpoint when
+                there are more than this many minutes between two of its events.
+        :param funnel_steps: The ordered funnel steps as a list of dictionaries, each
+                with a `name` and either an `analytics_event` or a `page_path` to match.
+        :param output_prefix: The key prefix for the output tables and the job state.
+        :param settle_minutes: Minutes to wait after the end of an hour before its
+                partition is processed.
+        :param max_partitions: The maximum number of hourly partitions per run.
+        :param kms_key_arn: The ARN of the bucket's KMS key, if the bucket is encrypted.
+        """
+        super().__init__("nuage:aws:SessionizationJob", name, None, opts)
+
+        bucket_arn = Output.from_input(bucket_name).apply(
+            lambda bucket: f"arn:aws:s3:::{bucket}"
+        )
+
+        role = iam.Role(
+            f"{name}Role",
+            assume_role_policy=get_sessionization_role_trust_policy_document(),
+        )
+
+        logs_policy_attachment = iam.RolePolicyAttachment(
+            f"{name}LogsPolicyAttachment",
+            role=role.name,
+            policy_arn="arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole",
+        )
+
+        role_policy = iam.RolePolicy(
+            f"{name}Policy",
+            role=role.name,
+            policy=get_sessionization_role_policy_document(
+                bucket_arn, output_prefix, config.region, kms_key_arn
+            ).apply(json.dumps),
+        )
+
+        function = lambda_.Function(
+            f"{name}Function",
+            runtime="python3.8",
+            handler="sessionizer.handler",
+            code=pulumi.AssetArchive(
+                {
+                    module: pulumi.FileAsset(os.path.join(SOURCE_DIR, module))
+                    for module in JOB_MODULES
+                }
+            ),
+            role=role.arn,
+            layers=layers,
+            timeout=900,
+            memory_size=1024,
+            environment={
+                "variables": {
+                    "BUCKET_NAME": bucket_name,
+                    "INACTIVITY_GAP_MINUTES": str(inactivity_gap_minutes),
+                    "FUNNEL_STEPS": json.dumps(funnel_steps or []),
+                    "OUTPUT_PREFIX": output_prefix,
+                    "SETTLE_MINUTES": str(settle_minutes),
+                    "MAX_PARTITIONS": str(max_partitions),
+                }
+            },
+            opts=ResourceOptions(depends_on=[role_policy, logs_policy_attachment]),
+        )
+
+        schedule_rule = cloudwatch.EventRule(
+            f"{name}Schedule", schedule_expression=schedule_expression
+        )
+
+        lambda_.Permission(
+            f"{name}SchedulePermission",
+            action="lambda:InvokeFunction",
+            function=function.name,
+            principal="events.amazonaws.com",
+            source_arn=schedule_rule.arn,
+        )
+
+        cloudwatch.EventTarget(
+            f"{name}ScheduleTarget", rule=schedule_rule.name, arn=function.arn,
+        )
+
+        outputs = {
+            "function_name": function.name,
+            "function_arn": function.arn,
+            "schedule_rule_name": schedule_rule.name,
+            "sessions_prefix": f"{output_prefix}sessions/",
+            "funnel_steps_prefix": f"{output_prefix}funnel_steps/",
+        }
+
+        self.set_outputs(outputs)
+
+    def set_outputs(self, outputs: dict):
+        """
+        Adds the Pulumi outputs as attributes on the current object so they can be
+        used as outputs by the caller, as well as registering them.
+        """
+        for output_name in outputs.keys():
+            setattr(self, output_name, outputs[output_name])
+
+        self.register_outputs(outputs)
@@ -0,0 +1,56 @@
+from typing import Optional
+
+from encryption_policy import get_bucket_key_policy_statement
+from pulumi.output import Output
+
+
+def get_sessionization_role_trust_policy_document():
+    return {
+        "Version": "2012-10-17",
+        "Statement": [
+            {
+                "Effect": "Allow",
+                "Principal": {"Service": "lambda.amazonaws.com"},
+                "Action": "sts:AssumeRole",
+            }
+        ],
+    }
+
+
+def get_sessionization_role_policy_document(
+    bucket_arn: Output[str],
+    output_prefix: str,
+    region: Optional[str] = None,
+    kms_key_arn: Optional[Output[str]] = None,
+):
+    """ Returns a policy permitting the sessionization job to read the raw events from
+        the analytics bucket, and to write its tables and state under `output_prefix`.
+
+        bucket_arn -- The analytics bucket ARN as a Pulumi Output
+        output_prefix -- The key prefix for the job's tables and state
+        region -- The region of the analytics bucket, if it is encrypted
+        kms_key_arn -- The ARN of the bucket's KMS key as a Pulumi Output, if the
+                bucket is encrypted
+    """
+
+    def get_document(arn, key_arn):
+        statements = [
+            {"Effect": "Allow", "Action": ["s3:ListBucket"], "Resource": [arn]},
+            {"Effect": "Allow", "Action": ["s3:GetObject"], "Resource": [f"{arn}/*"]},
+            {
+                "Effect": "Allow",
+                "Action": ["s3:PutObject", "s3:DeleteObject"],
+                "Resource": [f"{arn}/{output_prefix}*"],
+            },
+        ]
+        if key_arn is not None:
+            statements.append(
+                get_bucket_key_policy_statement(
+                    region, key_arn, arn, ["kms:Decrypt", "kms:GenerateDataKey"]
+                )
+            )
+        return {"Version": "2012-10-17", "Statement": statements}
+
+    return Output.all(bucket_arn, kms_key_arn).apply(
+        lambda outputs: get_document(outputs[0], outputs[1])
+    )
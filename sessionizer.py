@@ -0,0 +1,534 @@
+"""
+The sessionization job which runs inside the Lambda function created by the
+`nuage:aws:SessionizationJob` component.  Pinpoint events are delivered by Firehose
+into hourly `YYYY/MM/DD/HH/` partitions of the analytics bucket.  Each run reads only
+the partitions which have arrived since the stored watermark, groups the events into
+sessions per Pinpoint endpoint, and writes session and funnel-step Parquet tables back
+into the bucket under `OUTPUT_PREFIX`.
+
+The job can also be run locally against a folder of synthetic events:
+
+    python sessionizer.py --local-dir /tmp/analytics --synthetic-endpoints 100
+"""
+
+import argparse
+import gzip
+import io
+import json
+import os
+import random
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.json as pa_json
+from object_store import LocalStore, S3Store
+
+
+DEFAULT_INACTIVITY_GAP_MINUTES = 30
+
+# Firehose buffers for up to 15 minutes, so an hourly partition is only treated as
+# complete once this much time has passed since the end of the hour
+DEFAULT_SETTLE_MINUTES = 20
+
+# Upper bound on the number of hourly partitions processed by a single run, so that a
+# job catching up on a long backlog stays within the Lambda timeout
+DEFAULT_MAX_PARTITIONS = 24
+
+DEFAULT_OUTPUT_PREFIX = "sessionization/"
+
+PARTITION_FORMAT = "%Y/%m/%d/%H"
+
+EVENT_SCHEMA = pa.schema(
+    [
+        ("event_type", pa.string()),
+        ("event_timestamp", pa.int64()),
+        ("arrival_timestamp", pa.int64()),
+        ("client", pa.struct([("client_id", pa.string())])),
+        ("session", pa.struct([("session_id", pa.string())])),
+        (
+            "attributes",
+            pa.struct([("page_path", pa.string()), ("referrer", pa.string())]),
+        ),
+    ]
+)
+
+EVENT_COLUMNS = [
+    "endpoint_id",
+    "pinpoint_session_id",
+    "analytics_event",
+    "event_time",
+    "arrival_time",
+    "page_path",
+    "referrer",
+]
+
+
+class JobConfig:
+    """
+    The settings for a sessionization run, normally read from the Lambda environment.
+    """
+
+    def __init__(
+        self,
+        inactivity_gap_minutes: int = DEFAULT_INACTIVITY_GAP_MINUTES,
+        funnel_steps: Optional[List[dict]] = None,
+        output_prefix: str = DEFAULT_OUTPUT_PREFIX,
+        settle_minutes: int = DEFAULT_SETTLE_MINUTES,
+        max_partitions: int = DEFAULT_MAX_PARTITIONS,
+    ):
+        """
+        :param inactivity_gap_minutes: A new session is started for an endpoint when
+                there are more than this many minutes between two of its events.
+        :param funnel_steps: The ordered funnel steps as a list of dictionaries, each
+                with a `name` and either an `analytics_event` or a `page_path` to match.
+        :param output_prefix: The key prefix for the output tables and the job state.
+        :param settle_minutes: Minutes to wait after the end of an hour before its
+                partition is processed.
+        :param max_partitions: The maximum number of hourly partitions per run.
+        """
+        self.inactivity_gap = pd.Timedelta(minutes=inactivity_gap_minutes)
+        self.funnel_steps = funnel_steps or []
+        self.output_prefix = output_prefix
+        self.settle = timedelta(minutes=settle_minutes)
+        self.max_partitions = max_partitions
+
+        for step in self.funnel_steps:
+            if "name" not in step:
+                raise Exception(f"Funnel step {step} must have a name")
+            if ("analytics_event" in step) == ("page_path" in step):
+                raise Exception(
+                    f"Funnel step {step['name']} must match exactly one of "
+                    "analytics_event or page_path"
+                )
+
+    @staticmethod
+    def from_environment():
+        return JobConfig(
+            inactivity_gap_minutes=int(
+                os.environ.get("INACTIVITY_GAP_MINUTES", DEFAULT_INACTIVITY_GAP_MINUTES)
+            ),
+            funnel_steps=json.loads(os.environ.get("FUNNEL_STEPS", "[]")),
+            output_prefix=os.environ.get("OUTPUT_PREFIX", DEFAULT_OUTPUT_PREFIX),
+            settle_minutes=int(
+                os.environ.get("SETTLE_MINUTES", DEFAULT_SETTLE_MINUTES)
+            ),
+            max_partitions=int(
+                os.environ.get("MAX_PARTITIONS", DEFAULT_MAX_PARTITIONS)
+            ),
+        )
+
+    @property
+    def watermark_key(self):
+        return f"{self.output_prefix}_state/watermark.json"
+
+    @property
+    def state_prefix(self):
+        return f"{self.output_prefix}_state/"
+
+    def pending_key(self, watermark: str):
+        """ The key of the events pending after the partitions up to `watermark` """
+        return f"{self.state_prefix}pending-{watermark.replace('/', '-')}.parquet"
+
+
+def parse_events(body: bytes) -> pd.DataFrame:
+    """ Parses a (possibly gzipped) Firehose object of newline-delimited Pinpoint
+        events into a DataFrame with the columns in `EVENT_COLUMNS`.
+    """
+    if body[:2] == b"\x1f\x8b":
+        body = gzip.decompress(body)
+
+    if not body.strip():
+        return empty_events()
+
+    table = pa_json.read_json(
+        io.BytesIO(body),
+        parse_options=pa_json.ParseOptions(
+            explicit_schema=EVENT_SCHEMA, unexpected_field_behavior="ignore"
+        ),
+    ).flatten()
+
+    events = pd.DataFrame(
+        {
+            "endpoint_id": table.column("client.client_id").to_pandas(),
+            "pinpoint_session_id": table.column("session.session_id").to_pandas(),
+            "analytics_event": table.column("event_type").to_pandas(),
+            "event_time": pd.to_datetime(
+                table.column("event_timestamp").to_pandas(), unit="ms", utc=True
+            ),
+            "arrival_time": pd.to_datetime(
+                table.column("arrival_timestamp").to_pandas(), unit="ms", utc=True
+            ),
+            "page_path": table.column("attributes.page_path").to_pandas(),
+            "referrer": table.column("attributes.referrer").to_pandas(),
+        }
+    )
+
+    return events.dropna(subset=["endpoint_id", "event_time"])
+
+
+def empty_events() -> pd.DataFrame:
+    events = pd.DataFrame({column: pd.Series(dtype=object) for column in EVENT_COLUMNS})
+    for column in ["event_time", "arrival_time"]:
+        events[column] = events[column].astype("datetime64[ns, UTC]")
+    return events
+
+
+def concat_events(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """ Concatenates event frames, normalising the timestamp resolution so that frames
+        read back from Parquet can be combined with freshly parsed ones.
+    """
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return empty_events()
+
+    events = pd.concat(frames, ignore_index=True)
+    for column in ["event_time", "arrival_time"]:
+        events[column] = events[column].astype("datetime64[ns, UTC]")
+    return events
+
+
+def sessionize(events: pd.DataFrame, inactivity_gap: pd.Timedelta) -> pd.DataFrame:
+    """ Assigns a `session_id` to every event.  Events are grouped per endpoint, and a
+        new session starts whenever the gap since the endpoint's previous event is
+        greater than `inactivity_gap`.  The session ID is derived from the endpoint and
+        the session start time, so it is stable across runs.
+    """
+    events = events.sort_values(
+        ["endpoint_id", "event_time"], kind="mergesort"
+    ).reset_index(drop=True)
+
+    new_endpoint = events["endpoint_id"].ne(events["endpoint_id"].shift())
+    new_session = new_endpoint | (events["event_time"].diff() > inactivity_gap)
+
+    session_start = events["event_time"].where(new_session).ffill()
+    start_millis = (session_start - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(
+        milliseconds=1
+    )
+
+    events["session_id"] = (
+        events["endpoint_id"].astype(str) + "-" + start_millis.astype(str)
+    )
+    return events
+
+
+def summarize_sessions(events: pd.DataFrame) -> pd.DataFrame:
+    """ Returns one row per session from the output of `sessionize` """
+    sessions = (
+        events.groupby("session_id", sort=False)
+        .agg(
+            endpoint_id=("endpoint_id", "first"),
+            session_start=("event_time", "min"),
+            session_end=("event_time", "max"),
+            event_count=("event_time", "size"),
+            landing_page=("page_path", "first"),
+            exit_page=("page_path", "last"),
+            referrer=("referrer", "first"),
+        )
+        .reset_index()
+    )
+    sessions["duration_seconds"] = (
+        sessions["session_end"] - sessions["session_start"]
+    ).dt.total_seconds()
+    return sessions
+
+
+def compute_funnel_steps(events: pd.DataFrame, funnel_steps: List[dict]):
+    """ Returns one row per session and funnel step reached.  A step is reached at the
+        time of its first matching event at or after the previous step was reached.
+    """
+    columns = ["session_id", "endpoint_id", "step_index", "step_name", "reached_at"]
+    reached = None
+    frames = []
+
+    for step_index, step in enumerate(funnel_steps):
+        if "analytics_event" in step:
+            mask = events["analytics_event"] == step["analytics_event"]
+        else:
+            mask = events["page_path"] == step["page_path"]
+
+        candidates = events.loc[mask, ["session_id", "endpoint_id", "event_time"]]
+
+        if reached is not None:
+            candidates = candidates.merge(
+                reached[["session_id", "reached_at"]], on="session_id"
+            )
+            candidates = candidates[
+                candidates["event_time"] >= candidates["reached_at"]
+            ]
+
+        reached = (
+            candidates.groupby("session_id", sort=False)
+            .agg(
+                endpoint_id=("endpoint_id", "first"), reached_at=("event_time", "min"),
+            )
+            .reset_index()
+        )
+        reached["step_index"] = step_index
+        reached["step_name"] = step["name"]
+        frames.append(reached[columns])
+
+    if not frames:
+        return pd.DataFrame(columns=columns)
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def get_partitions_to_process(
+    store, watermark: Optional[str], now: datetime, config: JobConfig
+) -> List[str]:
+    """ Returns the hourly partitions after `watermark` which are complete at `now` """
+    cutoff = now - config.settle - timedelta(hours=1)
+
+    if watermark is None:
+        first = find_first_partition(store)
+        if first is None:
+            return []
+        hour = datetime.strptime(first, PARTITION_FORMAT).replace(tzinfo=timezone.utc)
+    else:
+        hour = datetime.strptime(watermark, PARTITION_FORMAT).replace(
+            tzinfo=timezone.utc
+        ) + timedelta(hours=1)
+
+    partitions = []
+    while hour <= cutoff and len(partitions) < config.max_partitions:
+        partitions.append(hour.strftime(PARTITION_FORMAT))
+        hour += timedelta(hours=1)
+
+    return partitions
+
+
+def find_first_partition(store) -> Optional[str]:
+    """ Finds the earliest `YYYY/MM/DD/HH` partition by descending into the smallest
+        prefix at each level, rather than listing the whole bucket.
+    """
+    prefix = ""
+    for width in [4, 2, 2, 2]:
+        levels = [
+            level
+            for level in store.list_prefixes(prefix)
+            if len(level) == width and level.isdigit()
+        ]
+        if not levels:
+            return None
+        prefix += levels[0] + "/"
+
+    return prefix.rstrip("/")
+
+
+def read_partition(store, partition: str) -> pd.DataFrame:
+    return concat_events(
+        [parse_events(store.read(key)) for key in store.list_keys(partition + "/")]
+    )
+
+
+def write_table(store, prefix: str, run_id: str, table: pd.DataFrame, date_column):
+    """ Writes a table as one Parquet object per `dt=YYYY-MM-DD` partition.  Keys are
+        derived from the run ID so re-running after a failure overwrites, rather than
+        duplicates, the output.
+    """
+    if table.empty:
+        return
+
+    dates = table[date_column].dt.strftime("%Y-%m-%d")
+    for date, rows in table.groupby(dates):
+        buffer = io.BytesIO()
+        # Athena and Glue cannot read nanosecond timestamps
+        rows.to_parquet(
+            buffer,
+            index=False,
+            coerce_timestamps="ms",
+            allow_truncated_timestamps=True,
+        )
+        store.write(f"{prefix}dt={date}/{run_id}.parquet", buffer.getvalue())
+
+
+def run(store, config: JobConfig, now: datetime) -> dict:
+    """ Processes the partitions which have arrived since the stored watermark, writes
+        the session and funnel-step tables, and advances the watermark.
+
+        Sessions which may still receive events from the next partition are not
+        written.  Their events are kept in a pending object and prepended to the next
+        run instead.  Partitions are cut by arrival time, so a session is closed once
+        its last event arrived an inactivity gap before the end of the batch, however
+        skewed the client's clock is.
+
+        The watermark object names the pending object which belongs to it, and is
+        written last, so a run which fails part way is retried from the previous
+        watermark and its pending events, overwriting the tables it wrote.
+    """
+    state_body = store.read(config.watermark_key)
+    state = json.loads(state_body) if state_body else {}
+    watermark = state.get("partition")
+    # Watermarks written before the pending key was stored with them
+    pending_key = state.get("pending", f"{config.state_prefix}pending.parquet")
+
+    partitions = get_partitions_to_process(store, watermark, now, config)
+    if not partitions:
+        return {"partitions": [], "sessions": 0, "watermark": watermark}
+
+    batch_start, batch_end = [
+        datetime.strptime(partition, PARTITION_FORMAT).replace(tzinfo=timezone.utc)
+        for partition in [partitions[0], partitions[-1]]
+    ]
+    batch_end += timedelta(hours=1)
+
+    frames = []
+    pending_body = store.read(pending_key) if pending_key else None
+    if pending_body:
+        frames.append(pd.read_parquet(io.BytesIO(pending_body)))
+        # Pending objects written before arrival times were kept hold events which
+        # arrived before the watermark
+        if "arrival_time" not in frames[0]:
+            frames[0]["arrival_time"] = pd.Timestamp(batch_start)
+    frames += [read_partition(store, partition) for partition in partitions]
+    events = sessionize(concat_events(frames), config.inactivity_gap)
+
+    last_arrival = events.groupby("session_id")["arrival_time"].transform("max")
+    is_open = last_arrival > pd.Timestamp(batch_end) - config.inactivity_gap
+
+    closed = events[~is_open]
+    sessions = summarize_sessions(closed)
+    funnel_steps = compute_funnel_steps(closed, config.funnel_steps)
+
+    # A retry starts from the same watermark, so it overwrites the same objects even
+    # if more partitions have arrived since the failed run
+    run_id = partitions[0].replace("/", "-")
+    write_table(
+        store, f"{config.output_prefix}sessions/", run_id, sessions, "session_start"
+    )
+    write_table(
+        store,
+        f"{config.output_prefix}funnel_steps/",
+        run_id,
+        funnel_steps,
+        "reached_at",
+    )
+
+    pending = events.loc[is_open, EVENT_COLUMNS]
+    new_pending_key = None
+    if not pending.empty:
+        new_pending_key = config.pending_key(partitions[-1])
+        buffer = io.BytesIO()
+        pending.to_parquet(buffer, index=False)
+        store.write(new_pending_key, buffer.getvalue())
+
+    store.write(
+        config.watermark_key,
+        json.dumps({"partition": partitions[-1], "pending": new_pending_key}).encode(),
+    )
+
+    # Only once the watermark has moved are the previous pending events, and those
+    # of any failed runs, no longer needed
+    for key in store.list_keys(f"{config.state_prefix}pending"):
+        if key != new_pending_key:
+            store.delete(key)
+
+    return {
+        "partitions": partitions,
+        "sessions": len(sessions),
+        "funnel_steps": len(funnel_steps),
+        "pending_events": len(pending),
+        "watermark": partitions[-1],
+    }
+
+
+def handler(event, context):
+    """ The Lambda entry point, invoked on a schedule """
+    store = S3Store(os.environ["BUCKET_NAME"])
+    return run(store, JobConfig.from_environment(), datetime.now(timezone.utc))
+
+
+def generate_synthetic_events(
+    start: datetime,
+    hours: int,
+    endpoints: int,
+    pages: Optional[List[str]] = None,
+    seed: int = 0,
+) -> List[dict]:
+    """ Generates Pinpoint event records, in the shape written by the Amplify tag,
+        for `endpoints` visitors browsing over `hours` hours.
+    """
+    pages = pages or ["/", "/products", "/search", "/checkout"]
+    rng = random.Random(seed)
+    records = []
+
+    for endpoint_index in range(endpoints):
+        endpoint_id = f"endpoint-{endpoint_index}"
+        time = start + timedelta(minutes=rng.uniform(0, 60 * hours))
+        end = start + timedelta(hours=hours)
+
+        while time < end:
+            page_path = rng.choice(pages)
+            records.append(
+                {
+                    "event_type": "search" if page_path == "/search" else "gtm.js",
+                    "event_timestamp": int(time.timestamp() * 1000),
+                    "arrival_timestamp": int(time.timestamp() * 1000),
+                    "client": {"client_id": endpoint_id},
+                    "session": {"session_id": f"{endpoint_id}-{rng.random()}"},
+                    "attributes": {
+                        "hostname": "example.com",
+                        "page_path": page_path,
+                        "page_url": f"http://example.com{page_path}",
+                        "referrer": "https://www.google.com/",
+                    },
+                }
+            )
+            # Mostly short gaps within a session, with the occasional long break
+            gap = rng.expovariate(1 / 3) if rng.random() < 0.9 else rng.uniform(45, 180)
+            time += timedelta(minutes=gap)
+
+    return records
+
+
+def write_synthetic_partitions(store, records: List[dict]):
+    """ Writes event records into hourly gzipped objects, as Firehose would """
+    by_partition = {}
+    for record in records:
+        arrival = datetime.fromtimestamp(
+            record["arrival_timestamp"] / 1000, tz=timezone.utc
+        )
+        by_partition.setdefault(arrival.strftime(PARTITION_FORMAT), []).append(record)
+
+    for partition, partition_records in by_partition.items():
+        body = "\n".join(json.dumps(record) for record in partition_records) + "\n"
+        object_name = partition.replace("/", "-")
+        store.write(
+            f"{partition}/synthetic-{object_name}.gz", gzip.compress(body.encode())
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Runs the sessionization job against a local folder"
+    )
+    parser.add_argument("--local-dir", required=True)
+    parser.add_argument("--synthetic-endpoints", type=int, default=0)
+    parser.add_argument("--synthetic-hours", type=int, default=6)
+    parser.add_argument("--funnel-steps", default="[]")
+    parser.add_argument(
+        "--inactivity-gap-minutes", type=int, default=DEFAULT_INACTIVITY_GAP_MINUTES
+    )
+    args = parser.parse_args()
+
+    local_store = LocalStore(args.local_dir)
+    now = datetime.now(timezone.utc)
+
+    if args.synthetic_endpoints:
+        start = now.replace(minute=0, second=0, microsecond=0) - timedelta(
+            hours=args.synthetic_hours + 2
+        )
+        write_synthetic_partitions(
+            local_store,
+            generate_synthetic_events(
+                start, args.synthetic_hours, args.synthetic_endpoints
+            ),
+        )
+
+    local_config = JobConfig(
+        inactivity_gap_minutes=args.inactivity_gap_minutes,
+        funnel_steps=json.loads(args.funnel_steps),
+    )
+    print(json.dumps(run(local_store, local_config, now), indent=2))
@@ -0,0 +1,116 @@
+"""
+Accuracy and throughput benchmarks for the stream sketches in `sketches.py`.
+
+A synthetic stream of events is generated with Zipf-distributed page paths and
+analytics events, sketched into minute windows, and the estimates compared with exact
+counts:
+
+    python sketch_benchmark.py --events 200000 --endpoints 50000
+"""
+
+import argparse
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from sketches import HyperLogLog, WindowSketch, merge_windows, sketch_events
+
+
+def generate_events(events: int, endpoints: int, minutes: int, seed: int = 0):
+    rng = random.Random(seed)
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    pages = [f"/page/{index}" for index in range(500)]
+    page_weights = [1 / (rank + 1) for rank in range(len(pages))]
+    names = [f"event_{index}" for index in range(50)]
+    name_weights = [1 / (rank + 1) for rank in range(len(names))]
+
+    for _ in range(events):
+        arrival = start + timedelta(seconds=rng.uniform(0, 60 * minutes))
+        yield {
+            "event_type": rng.choices(names, name_weights)[0],
+            "arrival_timestamp": int(arrival.timestamp() * 1000),
+            "client": {"client_id": f"endpoint-{rng.randrange(endpoints)}"},
+            "attributes": {"page_path": rng.choices(pages, page_weights)[0]},
+        }
+
+
+def benchmark_hll_accuracy(cardinalities, trials: int):
+    print("HyperLogLog relative error (precision 12, expected ~1.6%)")
+    for cardinality in cardinalities:
+        errors = []
+        for trial in range(trials):
+            hll = HyperLogLog()
+            for index in range(cardinality):
+                hll.add(f"{trial}-{index}")
+            errors.append(abs(hll.estimate() - cardinality) / cardinality)
+        print(
+            f"  n={cardinality:>8}  mean={sum(errors) / trials:.2%}  "
+            f"max={max(errors):.2%}"
+        )
+
+
+def benchmark_stream(events: int, endpoints: int, minutes: int):
+    stream = list(generate_events(events, endpoints, minutes))
+
+    started = time.perf_counter()
+    windows = sketch_events(stream)
+    sketch_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    snapshots = [window.to_bytes() for window in windows.values()]
+    serialize_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    merged = merge_windows(WindowSketch.from_bytes(body) for body in snapshots)
+    merge_seconds = time.perf_counter() - started
+
+    print(f"Stream of {events} events over {minutes} minute windows")
+    print(f"  sketching:  {events / sketch_seconds:,.0f} events/s")
+    print(
+        f"  snapshots:  {len(snapshots) / serialize_seconds:,.0f} windows/s, "
+        f"{sum(map(len, snapshots)) / len(snapshots) / 1024:.1f} KiB per window"
+    )
+    print(f"  merging:    {len(snapshots) / merge_seconds:,.0f} windows/s")
+
+    exact_endpoints = len({event["client"]["client_id"] for event in stream})
+    estimate = merged.unique_endpoints.estimate()
+    print(
+        f"  unique endpoints: exact={exact_endpoints} estimate={estimate} "
+        f"error={abs(estimate - exact_endpoints) / exact_endpoints:.2%}"
+    )
+
+    for label, top_k, exact in [
+        (
+            "page_path",
+            merged.page_paths,
+            Counter(event["attributes"]["page_path"] for event in stream),
+        ),
+        (
+            "analytics_event",
+            merged.analytics_events,
+            Counter(e["event_type"] for e in stream),
+        ),
+    ]:
+        estimated_top = top_k.top()
+        exact_top = {value for value, _ in exact.most_common(top_k.k)}
+        recall = len(exact_top & {value for value, _ in estimated_top}) / top_k.k
+        overcount = max(
+            (count - exact[value]) / events for value, count in estimated_top
+        )
+        print(
+            f"  top {top_k.k} {label}: recall={recall:.0%} "
+            f"max overcount={overcount:.3%} of events"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--endpoints", type=int, default=20000)
+    parser.add_argument("--minutes", type=int, default=60)
+    parser.add_argument("--trials", type=int, default=5)
+    args = parser.parse_args()
+
+    benchmark_hll_accuracy([100, 1000, 10000, 100000], args.trials)
+    benchmark_stream(args.events, args.endpoints, args.minutes)
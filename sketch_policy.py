@@ -0,0 +1,54 @@
+from typing import Optional
+
+from encryption_policy import get_bucket_key_policy_statement
+from pulumi.output import Output
+
+
+def get_stream_sketches_role_trust_policy_document():
+    return {
+        "Version": "2012-10-17",
+        "Statement": [
+            {
+                "Effect": "Allow",
+                "Principal": {"Service": "lambda.amazonaws.com"},
+                "Action": "sts:AssumeRole",
+            }
+        ],
+    }
+
+
+def get_stream_sketches_role_policy_document(
+    bucket_arn: Output[str],
+    snapshot_prefix: str,
+    region: Optional[str] = None,
+    kms_key_arn: Optional[Output[str]] = None,
+):
+    """ Returns a policy permitting the Firehose transform to write sketch snapshots
+        under `snapshot_prefix` in the analytics bucket.
+
+        bucket_arn -- The analytics bucket ARN as a Pulumi Output
+        snapshot_prefix -- The key prefix for the sketch snapshots
+        region -- The region of the analytics bucket, if it is encrypted
+        kms_key_arn -- The ARN of the bucket's KMS key as a Pulumi Output, if the
+                bucket is encrypted
+    """
+
+    def get_document(arn, key_arn):
+        statements = [
+            {
+                "Effect": "Allow",
+                "Action": ["s3:PutObject"],
+                "Resource": [f"{arn}/{snapshot_prefix}*"],
+            },
+        ]
+        if key_arn is not None:
+            statements.append(
+                get_bucket_key_policy_statement(
+                    region, key_arn, arn, ["kms:GenerateDataKey"]
+                )
+            )
+        return {"Version": "2012-10-17", "Statement": statements}
+
+    return Output.all(bucket_arn, kms_key_arn).apply(
+        lambda outputs: get_document(outputs[0], outputs[1])
+    )
@@ -0,0 +1,460 @@
+"""
+Mergeable sketches of the analytics event stream, maintained per minute window by the
+Firehose transform function created by the `nuage:aws:StreamSketches` component.
+
+Each window holds a HyperLogLog of unique Pinpoint endpoints and count-min/top-K
+sketches of `page_path` and `analytics_event`.  Every invocation of the transform
+writes a snapshot of the windows it has seen, so a minute may have several snapshots;
+they are combined when read with `load_windows` and `merge_windows`.  Snapshots are
+named after the batch of records, so a batch retried by Firehose overwrites its own
+snapshot rather than being counted twice:
+
+    store = S3Store("my-analytics-bucket")
+    windows = load_windows(store, start, end)
+    last_hour = merge_windows(windows.values())
+    print(last_hour.unique_endpoints.estimate(), last_hour.page_paths.top())
+
+The module only depends on the standard library, so it runs on the plain Lambda
+Python runtime.
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import logging
+import math
+import os
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from object_store import S3Store
+
+DEFAULT_HLL_PRECISION = 12
+
+DEFAULT_CMS_WIDTH = 1024
+
+DEFAULT_CMS_DEPTH = 4
+
+DEFAULT_TOP_K = 10
+
+DEFAULT_SNAPSHOT_PREFIX = "sketches/"
+
+WINDOW_FORMAT = "%Y/%m/%d/%H/%M"
+
+logger = logging.getLogger(__name__)
+
+
+def hash64(value: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big"
+    )
+
+
+class HyperLogLog:
+    """
+    Estimates the number of distinct values added, with a standard error of about
+    `1.04 / sqrt(2 ** precision)`.  Merging two sketches gives the sketch of the union.
+    """
+
+    def __init__(self, precision: int = DEFAULT_HLL_PRECISION, registers=None):
+        self.precision = precision
+        self.registers = (
+            bytearray(registers) if registers is not None else bytearray(1 << precision)
+        )
+
+    def add(self, value: str):
+        self.add_hash(hash64(value))
+
+    def add_hash(self, hashed: int):
+        index = hashed >> (64 - self.precision)
+        remainder = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = 64 - self.precision - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        if other.precision != self.precision:
+            raise Exception("Cannot merge HyperLogLogs with different precisions")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def estimate(self) -> int:
+        """ Uses Ertl's improved estimator, which avoids the bias of the original
+            HyperLogLog estimator at small and intermediate cardinalities without
+            needing empirical correction tables.
+        """
+        m = len(self.registers)
+        q = 64 - self.precision
+        histogram = [0] * (q + 2)
+        for register in self.registers:
+            histogram[register] += 1
+
+        z = m * _tau(1 - histogram[q + 1] / m)
+        for rank in range(q, 0, -1):
+            z = 0.5 * (z + histogram[rank])
+        z += m * _sigma(histogram[0] / m)
+
+        return int(round(m * m / (2 * math.log(2) * z)))
+
+    def to_dict(self) -> dict:
+        return {
+            "precision": self.precision,
+            "registers": base64.b64encode(bytes(self.registers)).decode(),
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> "HyperLogLog":
+        return HyperLogLog(data["precision"], base64.b64decode(data["registers"]))
+
+
+def _sigma(x: float) -> float:
+    if x == 1:
+        return math.inf
+    y, z = 1.0, x
+    while True:
+        x *= x
+        previous = z
+        z += x * y
+        y += y
+        if z == previous:
+            return z
+
+
+def _tau(x: float) -> float:
+    if x == 0 or x == 1:
+        return 0.0
+    y, z = 1.0, 1 - x
+    while True:
+        x = math.sqrt(x)
+        previous = z
+        y *= 0.5
+        z -= (1 - x) ** 2 * y
+        if z == previous:
+            return z / 3
+
+
+class CountMinSketch:
+    """
+    Estimates the count of each value added.  Estimates are never too low, and are too
+    high by at most `e / width` of the total count with probability `1 - e ** -depth`.
+    Merging two sketches adds their counts.
+    """
+
+    def __init__(
+        self,
+        width: int = DEFAULT_CMS_WIDTH,
+        depth: int = DEFAULT_CMS_DEPTH,
+        counts=None,
+    ):
+        self.width = width
+        self.depth = depth
+        self.counts = array(
+            "I", counts if counts is not None else bytes(4 * width * depth)
+        )
+
+    def indexes(self, value: str) -> List[int]:
+        # Double hashing gives `depth` independent-enough rows from a single hash
+        hashed = hash64(value)
+        low, high = hashed & 0xFFFFFFFF, hashed >> 32
+        return [
+            row * self.width + (low + row * high) % self.width
+            for row in range(self.depth)
+        ]
+
+    def add(self, value: str, count: int = 1) -> int:
+        """ Adds `count` occurrences of `value` and returns its new estimate """
+        estimate = None
+        for index in self.indexes(value):
+            self.counts[index] += count
+            if estimate is None or self.counts[index] < estimate:
+                estimate = self.counts[index]
+        return estimate
+
+    def estimate(self, value: str) -> int:
+        return min(self.counts[index] for index in self.indexes(value))
+
+    def merge(self, other: "CountMinSketch"):
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise Exception("Cannot merge count-min sketches with different sizes")
+        self.counts = array("I", map(sum, zip(self.counts, other.counts)))
+        return self
+
+    def to_dict(self) -> dict:
+        return {
+            "width": self.width,
+            "depth": self.depth,
+            "counts": base64.b64encode(self.counts.tobytes()).decode(),
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> "CountMinSketch":
+        return CountMinSketch(
+            data["width"], data["depth"], base64.b64decode(data["counts"])
+        )
+
+
+class TopK:
+    """
+    Tracks the most frequent values using a count-min sketch for the counts and a
+    small set of candidate heavy hitters.  More candidates than `k` are kept so that
+    the top values of merged windows are still found after merging.
+    """
+
+    def __init__(
+        self,
+        k: int = DEFAULT_TOP_K,
+        sketch: Optional[CountMinSketch] = None,
+        candidates: Optional[Dict[str, int]] = None,
+    ):
+        self.k = k
+        self.capacity = 4 * k
+        self.sketch = sketch or CountMinSketch()
+        self.candidates = candidates or {}
+        self.total = 0
+
+    def add(self, value: str, count: int = 1):
+        estimate = self.sketch.add(value, count)
+        self.total += count
+
+        if value in self.candidates or len(self.candidates) < self.capacity:
+            self.candidates[value] = estimate
+            return
+
+        smallest = min(self.candidates, key=self.candidates.get)
+        if estimate > self.candidates[smallest]:
+            del self.candidates[smallest]
+            self.candidates[value] = estimate
+
+    def top(self, k: Optional[int] = None) -> List[Tuple[str, int]]:
+        limit = k or self.k
+        ranked = sorted(self.candidates.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit]
+
+    def merge(self, other: "TopK"):
+        self.sketch.merge(other.sketch)
+        self.total += other.total
+
+        values = set(self.candidates) | set(other.candidates)
+        estimates = {value: self.sketch.estimate(value) for value in values}
+        self.candidates = dict(
+            sorted(estimates.items(), key=lambda item: -item[1])[: self.capacity]
+        )
+        return self
+
+    def to_dict(self) -> dict:
+        return {
+            "k": self.k,
+            "total": self.total,
+            "sketch": self.sketch.to_dict(),
+            "candidates": self.candidates,
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> "TopK":
+        top_k = TopK(
+            data["k"], CountMinSketch.from_dict(data["sketch"]), data["candidates"]
+        )
+        top_k.total = data["total"]
+        return top_k
+
+
+class WindowSketch:
+    """
+    The sketches of all events which arrived in a window, starting at `window_start`.
+    """
+
+    def __init__(self, window_start: datetime):
+        self.window_start = window_start
+        self.event_count = 0
+        self.unique_endpoints = HyperLogLog()
+        self.page_paths = TopK()
+        self.analytics_events = TopK()
+
+    def add(
+        self,
+        endpoint_id: Optional[str],
+        page_path: Optional[str],
+        analytics_event: Optional[str],
+    ):
+        self.event_count += 1
+        if endpoint_id is not None:
+            self.unique_endpoints.add(endpoint_id)
+        if page_path is not None:
+            self.page_paths.add(page_path)
+        if analytics_event is not None:
+            self.analytics_events.add(analytics_event)
+
+    def merge(self, other: "WindowSketch"):
+        """ Merges `other` into this sketch, which then covers both windows """
+        self.window_start = min(self.window_start, other.window_start)
+        self.event_count += other.event_count
+        self.unique_endpoints.merge(other.unique_endpoints)
+        self.page_paths.merge(other.page_paths)
+        self.analytics_events.merge(other.analytics_events)
+        return self
+
+    def summary(self) -> dict:
+        return {
+            "window_start": self.window_start.isoformat(),
+            "event_count": self.event_count,
+            "unique_endpoints": self.unique_endpoints.estimate(),
+            "top_page_paths": self.page_paths.top(),
+            "top_analytics_events": self.analytics_events.top(),
+        }
+
+    def to_bytes(self) -> bytes:
+        # The default level is much slower on sparse sketches for a negligible saving
+        return gzip.compress(
+            json.dumps(
+                {
+                    "window_start": self.window_start.isoformat(),
+                    "event_count": self.event_count,
+                    "unique_endpoints": self.unique_endpoints.to_dict(),
+                    "page_paths": self.page_paths.to_dict(),
+                    "analytics_events": self.analytics_events.to_dict(),
+                }
+            ).encode(),
+            compresslevel=6,
+        )
+
+    @staticmethod
+    def from_bytes(body: bytes) -> "WindowSketch":
+        data = json.loads(gzip.decompress(body))
+        sketch = WindowSketch(datetime.fromisoformat(data["window_start"]))
+        sketch.event_count = data["event_count"]
+        sketch.unique_endpoints = HyperLogLog.from_dict(data["unique_endpoints"])
+        sketch.page_paths = TopK.from_dict(data["page_paths"])
+        sketch.analytics_events = TopK.from_dict(data["analytics_events"])
+        return sketch
+
+
+def merge_windows(windows: Iterable[WindowSketch]) -> Optional[WindowSketch]:
+    """ Merges window sketches into a single sketch covering all of them """
+    merged = None
+    for window in windows:
+        if merged is None:
+            merged = WindowSketch(window.window_start)
+        merged.merge(window)
+    return merged
+
+
+def get_window_start(event: dict) -> datetime:
+    """ Returns the minute in which a Pinpoint event arrived """
+    timestamp = event.get("arrival_timestamp") or event["event_timestamp"]
+    return datetime.fromtimestamp(timestamp // 60000 * 60, tz=timezone.utc)
+
+
+def sketch_events(events: Iterable[dict]) -> Dict[datetime, WindowSketch]:
+    """ Adds Pinpoint events to the sketches of the minute windows they arrived in """
+    windows = {}
+    for event in events:
+        window_start = get_window_start(event)
+        if window_start not in windows:
+            windows[window_start] = WindowSketch(window_start)
+
+        attributes = event.get("attributes") or {}
+        windows[window_start].add(
+            (event.get("client") or {}).get("client_id"),
+            attributes.get("page_path"),
+            event.get("event_type"),
+        )
+    return windows
+
+
+def get_snapshot_key(prefix: str, window_start: datetime, snapshot_id: str) -> str:
+    return f"{prefix}{window_start.strftime(WINDOW_FORMAT)}/{snapshot_id}.sketch"
+
+
+def write_snapshots(
+    store, windows: Dict[datetime, WindowSketch], prefix: str, snapshot_id: str
+):
+    for window_start, window in windows.items():
+        store.write(
+            get_snapshot_key(prefix, window_start, snapshot_id), window.to_bytes()
+        )
+
+
+def load_windows(
+    store, start: datetime, end: datetime, prefix: str = DEFAULT_SNAPSHOT_PREFIX,
+) -> Dict[datetime, WindowSketch]:
+    """ Reads the snapshots of the minute windows in `[start, end)`, merging the
+        snapshots written for the same minute by different invocations.
+    """
+    windows = {}
+    hour = start.replace(minute=0, second=0, microsecond=0)
+
+    while hour < end:
+        for key in store.list_keys(f"{prefix}{hour.strftime('%Y/%m/%d/%H')}/"):
+            minute = "/".join(key.split("/")[-6:-1])
+            window_start = datetime.strptime(minute, WINDOW_FORMAT).replace(
+                tzinfo=timezone.utc
+            )
+            if not start <= window_start < end:
+                continue
+
+            snapshot = WindowSketch.from_bytes(store.read(key))
+            if window_start in windows:
+                windows[window_start].merge(snapshot)
+            else:
+                windows[window_start] = snapshot
+
+        hour += timedelta(hours=1)
+
+    return windows
+
+
+def parse_records(records: List[dict]) -> Iterable[dict]:
+    """ Yields the Pinpoint events in a batch of Firehose transform records """
+    for record in records:
+        for line in base64.b64decode(record["data"]).splitlines():
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # The transform must never drop data, so malformed events are
+                # delivered to S3 as they are but left out of the sketches
+                continue
+
+
+def get_snapshot_id(records: List[dict]) -> str:
+    """ Returns an ID for a batch of Firehose transform records.  Firehose retries a
+        batch with the same record IDs, so the retry has the same snapshot ID.
+    """
+    batch = f"{records[0]['recordId']}/{records[-1]['recordId']}/{len(records)}"
+    return hashlib.sha256(batch.encode()).hexdigest()[:32]
+
+
+def transform(store, records: List[dict], prefix: str) -> dict:
+    """ Writes the snapshots of a batch of Firehose transform records to `store`, and
+        returns the records unchanged.  Sketches are optional, so a failure to write
+        them is logged rather than failing the batch and holding back the events.
+    """
+    if records:
+        try:
+            write_snapshots(
+                store,
+                sketch_events(parse_records(records)),
+                prefix,
+                get_snapshot_id(records),
+            )
+        except Exception:
+            logger.exception("Failed to write the sketches of %d records", len(records))
+
+    return {
+        "records": [
+            {"recordId": record["recordId"], "result": "Ok", "data": record["data"]}
+            for record in records
+        ]
+    }
+
+
+def handler(event, context):
+    """ The Firehose transform entry point.  Records are passed through unchanged. """
+    return transform(
+        S3Store(os.environ["BUCKET_NAME"]),
+        event["records"],
+        os.environ.get("SNAPSHOT_PREFIX", DEFAULT_SNAPSHOT_PREFIX),
+    )
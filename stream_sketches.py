@@ -0,0 +1,126 @@
+import json
+import os
+
+import pulumi
+from pulumi.output import Input, Output
+from pulumi.resource import ResourceOptions
+from pulumi_aws import config, iam, lambda_
+from sketch_policy import (
+    get_stream_sketches_role_policy_document,
+    get_stream_sketches_role_trust_policy_document,
+)
+
+SOURCE_DIR = os.path.dirname(__file__)
+
+# The modules packaged into the Lambda function
+FUNCTION_MODULES = ["sketches.py", "object_store.py"]
+
+
+class StreamSketches(pulumi.ComponentResource):
+    """
+    The `nuage:aws:StreamSketches` component creates a Lambda function for use as a
+    Firehose data transformation.  It passes records through unchanged, and writes
+    per-minute HyperLogLog and count-min/top-K sketches of the events to the analytics
+    bucket so that dashboards can read approximate unique visitors and top pages
+    without scanning the raw events.  See `sketches.py` for reading and merging the
+    snapshots.
+    """
+
+    function_name: Output[str]
+    """
+    The name of the Lambda function which sketches the stream
+    """
+
+    function_arn: Output[str]
+    """
+    The ARN of the Lambda function which sketches the stream
+    """
+
+    processor_arn: Output[str]
+    """
+    The qualified function ARN to use as the `LambdaArn` of a Firehose processor
+    """
+
+    snapshot_prefix: Output[str]
+    """
+    The key prefix of the sketch snapshots in the analytics bucket
+    """
+
+    def __init__(
+        self,
+        name: str,
+        bucket_name: Input[str],
+        snapshot_prefix: str = "sketches/",
+        kms_key_arn: Input[str] = None,
+        opts=None,
+    ):
+        """
+        :param bucket_name: The name of the bucket into which snapshots are written.
+        :param snapshot_prefix: The key prefix for the sketch snapshots.
+        :param kms_key_arn: The ARN of the bucket's KMS key, if the bucket is encrypted.
+        """
+        super().__init__("nuage:aws:StreamSketches", name, None, opts)
+
+        bucket_arn = Output.from_input(bucket_name).apply(
+            lambda bucket: f"arn:aws:s3:::{bucket}"
+        )
+
+        role = iam.Role(
+            f"{name}Role",
+            assume_role_policy=get_stream_sketches_role_trust_policy_document(),
+        )
+
+        logs_policy_attachment = iam.RolePolicyAttachment(
+            f"{name}LogsPolicyAttachment",
+            role=role.name,
+            policy_arn="arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole",
+        )
+
+        role_policy = iam.RolePolicy(
+            f"{name}Policy",
+            role=role.name,
+            policy=get_stream_sketches_role_policy_document(
+                bucket_arn, snapshot_prefix, config.region, kms_key_arn
+            ).apply(json.dumps),
+        )
+
+        function = lambda_.Function(
+            f"{name}Function",
+            runtime="python3.8",
+            handler="sketches.handler",
+            code=pulumi.AssetArchive(
+                {
+                    module: pulumi.FileAsset(os.path.join(SOURCE_DIR, module))
+                    for module in FUNCTION_MODULES
+                }
+            ),
+            role=role.arn,
+            timeout=60,
+            memory_size=512,
+            environment={
+                "variables": {
+                    "BUCKET_NAME": bucket_name,
+                    "SNAPSHOT_PREFIX": snapshot_prefix,
+                }
+            },
+            opts=ResourceOptions(depends_on=[role_policy, logs_policy_attachment]),
+        )
+
+        outputs = {
+            "function_name": function.name,
+            "function_arn": function.arn,
+            "processor_arn": function.arn.apply(lambda arn: f"{arn}:$LATEST"),
+            "snapshot_prefix": snapshot_prefix,
+        }
+
+        self.set_outputs(outputs)
+
+    def set_outputs(self, outputs: dict):
+        """
+        Adds the Pulumi outputs as attributes on the current object so they can be
+        used as outputs by the caller, as well as registering them.
+        """
+        for output_name in outputs.keys():
+            setattr(self, output_name, outputs[output_name])
+
+        self.register_outputs(outputs)
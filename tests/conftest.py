@@ -0,0 +1,177 @@
+"""
+Shared fixtures for the unit tests.  Programs are built against the Pulumi mock
+engine, and every resource registration is recorded in a `ResourceGraph` so that
+tests can make assertions about the resources, their inputs and their dependencies.
+"""
+
+import json
+from typing import Callable, Dict, List, NamedTuple, Set
+
+import pulumi
+import pytest
+
+ACCOUNT_ID = "123456789012"
+
+REGION = "eu-west-1"
+
+# `pulumi_aws.config` reads the region when it is first imported, so the config must
+# be in place before any test module imports the components
+pulumi.runtime.set_config("aws:region", REGION)
+pulumi.runtime.set_config("project:gtm_account_id", "1234567")
+pulumi.runtime.set_config("project:ga_account_id", "7654321")
+
+
+class Registration(NamedTuple):
+    urn: str
+    type: str
+    name: str
+    inputs: dict
+    dependencies: List[str]
+    aliases: List[str]
+    ignore_changes: List[str]
+
+
+class ResourceGraph:
+    """
+    The resources registered while building a program, keyed by URN.
+    """
+
+    def __init__(self):
+        self.resources: Dict[str, Registration] = {}
+
+    def add(self, registration: Registration):
+        # The engine rejects duplicate URNs, but the mock engine does not
+        if registration.urn in self.resources:
+            raise Exception(f"Duplicate resource URN {registration.urn}")
+        self.resources[registration.urn] = registration
+
+    def names(self, type_: str = None) -> Set[str]:
+        return {
+            registration.name
+            for registration in self.resources.values()
+            if type_ is None or registration.type == type_
+        }
+
+    def get(self, name: str) -> Registration:
+        """ Returns the custom (non-component) resource with the given name """
+        matches = [
+            registration
+            for registration in self.resources.values()
+            if registration.name == name and not registration.type.startswith("nuage:")
+        ]
+        if len(matches) != 1:
+            raise KeyError(name)
+        return matches[0]
+
+    def inputs(self, name: str) -> dict:
+        return self.get(name).inputs
+
+    def policy(self, name: str) -> dict:
+        return json.loads(self.inputs(name)["policy"])
+
+    def dependencies(self, name: str) -> Set[str]:
+        return {self.resources[urn].name for urn in self.get(name).dependencies}
+
+    def longest_chain(self) -> int:
+        """ The number of resources on the longest dependency chain, which is the
+            number of resources which must be created one after another.
+        """
+        lengths: Dict[str, int] = {}
+
+        def length(urn):
+            if urn not in lengths:
+                lengths[urn] = 1 + max(
+                    map(length, self.resources[urn].dependencies), default=0
+                )
+            return lengths[urn]
+
+        return max(map(length, self.resources))
+
+
+class AnalyticsMocks(pulumi.runtime.Mocks):
+    """
+    Returns the inputs of each resource as its state, along with the computed
+    properties which the components read.
+    """
+
+    def new_resource(self, type_, name, inputs, provider, id_):
+        state = {
+            "arn": f"arn:aws:mock:{REGION}:{ACCOUNT_ID}:{name}",
+            "name": name,
+            "applicationId": f"{name}-application-id",
+            **inputs,
+        }
+        return f"{name}-id", state
+
+    def call(self, token, args, provider):
+        if token == "aws:index/getCallerIdentity:getCallerIdentity":
+            return {
+                "accountId": ACCOUNT_ID,
+                "arn": f"arn:aws:iam::{ACCOUNT_ID}:user/test",
+                "userId": "test",
+            }
+        return {}
+
+
+def build_program(program: Callable, preview: bool = False) -> ResourceGraph:
+    """ Runs `program` against the mock engine, waiting for every resource to be
+        registered, and returns the resulting graph.
+    """
+    graph = ResourceGraph()
+    inputs_by_name = {}
+
+    class RecordingMocks(AnalyticsMocks):
+        def new_resource(self, type_, name, inputs, provider, id_):
+            inputs_by_name[name] = inputs
+            return super().new_resource(type_, name, inputs, provider, id_)
+
+    pulumi.runtime.set_mocks(RecordingMocks(), preview=preview)
+
+    monitor = pulumi.runtime.settings.SETTINGS.monitor
+    register_resource = monitor.RegisterResource
+
+    def record_resource(request):
+        response = register_resource(request)
+        if request.type != "pulumi:pulumi:Stack":
+            graph.add(
+                Registration(
+                    response.urn,
+                    request.type,
+                    request.name,
+                    inputs_by_name.get(request.name, {}),
+                    list(request.dependencies),
+                    list(request.aliases),
+                    list(request.ignoreChanges),
+                )
+            )
+        return response
+
+    monitor.RegisterResource = record_resource
+
+    pulumi.runtime.test(program)()
+    return graph
+
+
+def resolve_output(func: Callable):
+    """ Runs `func` against the mock engine and returns the resolved value of the
+        Pulumi output which it returns.  This allows policy documents built from
+        outputs to be tested without building a component.
+    """
+    result = {}
+    pulumi.runtime.set_mocks(AnalyticsMocks())
+    pulumi.runtime.test(
+        lambda: pulumi.Output.from_input(func()).apply(
+            lambda value: result.update(value=value)
+        )
+    )()
+    return result["value"]
+
+
+@pytest.fixture
+def build():
+    return build_program
+
+
+@pytest.fixture
+def resolve():
+    return resolve_output
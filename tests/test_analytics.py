@@ -0,0 +1,355 @@
+import importlib.util
+import json
+
+import pytest
+from analytics import Analytics
+from conftest import ACCOUNT_ID, REGION
+from pulumi.runtime.config import CONFIG
+
+requires_gtm = pytest.mark.skipif(
+    importlib.util.find_spec("pulumi_google_tag_manager") is None
+    or importlib.util.find_spec("pulumi_google_analytics") is None,
+    reason="The Tag Manager and Google Analytics projects are not installed",
+)
+
+AWS_RESOURCES = {
+    "TestBucket": "aws:s3/bucket:Bucket",
+    "TestFirehoseRole": "aws:iam/role:Role",
+    "TestDeliveryStream": "aws:kinesis/firehoseDeliveryStream:FirehoseDeliveryStream",
+    "TestDeliveryStreamPolicy": "aws:iam/rolePolicy:RolePolicy",
+    "TestPinpointApp": "aws:pinpoint/app:App",
+    "TestPinpointStreamRole": "aws:iam/role:Role",
+    "TestPinpointStreamPolicy": "aws:iam/rolePolicy:RolePolicy",
+    "TestEventStreamRoleDelay": "pulumi-python:dynamic:Resource",
+    "TestPinpointEventStream": "aws:pinpoint/eventStream:EventStream",
+}
+
+GTM_RESOURCES = {
+    "TestContainer",
+    "TestWorkspace",
+    "TestEventVariable",
+    "TestDataVariable",
+    "TestEventTrigger",
+    "TestPageviewTrigger",
+    "TestAmplifyTag",
+    "TestWebProperty",
+    "TestGAEventTag",
+    "TestGAPageviewTag",
+    "TestWorkspacePublish",
+}
+
+
+@pytest.fixture
+def provider_settings(monkeypatch):
+    """ Configures the stack's `aws` provider with a profile and a role to assume """
+    settings = {
+        "profile": "analytics",
+        "assume_role": {"roleArn": f"arn:aws:iam::{ACCOUNT_ID}:role/deploy"},
+    }
+    monkeypatch.setitem(CONFIG, "aws:profile", settings["profile"])
+    monkeypatch.setitem(CONFIG, "aws:assumeRole", json.dumps(settings["assume_role"]))
+    return settings
+
+
+def build_analytics(build, **kwargs):
+    return build(lambda: Analytics("Test", **kwargs))
+
+
+def test_resources_without_gtm(build):
+    graph = build_analytics(build, should_create_gtm_tag=False)
+
+    assert graph.names() == {"Test", *AWS_RESOURCES}
+    assert graph.names("nuage:aws:Analytics") == {"Test"}
+    assert graph.names("nuage:aws:GtmAnalytics") == set()
+    for name, type_ in AWS_RESOURCES.items():
+        assert graph.get(name).type == type_
+
+
+@requires_gtm
+def test_resources_with_gtm(build):
+    graph = build_analytics(build, site_name="TestSite", site_url="http://example.com")
+
+    assert graph.names() == {"Test", *AWS_RESOURCES, *GTM_RESOURCES}
+    assert graph.names("nuage:aws:GtmAnalytics") == {"Test"}
+    assert graph.dependencies("TestWorkspacePublish") == GTM_RESOURCES - {
+        "TestWorkspacePublish",
+        "TestWebProperty",
+    }
+
+
+@pytest.mark.parametrize("missing", ["site_name", "site_url"])
+def test_gtm_requires_site(build, missing):
+    kwargs = {"site_name": "TestSite", "site_url": "http://example.com"}
+    del kwargs[missing]
+
+    with pytest.raises(Exception, match=missing):
+        build_analytics(build, **kwargs)
+
+
+def test_dependencies(build):
+    graph = build_analytics(build, should_create_gtm_tag=False)
+
+    assert graph.dependencies("TestDeliveryStream") == {
+        "TestBucket",
+        "TestFirehoseRole",
+    }
+    assert graph.dependencies("TestDeliveryStreamPolicy") == {
+        "TestBucket",
+        "TestFirehoseRole",
+        "TestDeliveryStream",
+    }
+    assert graph.dependencies("TestPinpointStreamPolicy") == {
+        "TestPinpointStreamRole",
+        "TestPinpointApp",
+        "TestDeliveryStream",
+    }
+    assert graph.dependencies("TestEventStreamRoleDelay") == {
+        "TestPinpointStreamPolicy"
+    }
+    assert graph.dependencies("TestPinpointEventStream") == {
+        "TestPinpointApp",
+        "TestPinpointStreamRole",
+        "TestDeliveryStream",
+        "TestEventStreamRoleDelay",
+    }
+
+
+def test_delay_keeps_its_original_urn(build):
+    graph = build_analytics(build, should_create_gtm_tag=False)
+
+    assert graph.get("TestEventStreamRoleDelay").aliases == [
+        "urn:pulumi:stack::project::pulumi-python:dynamic:Resource::EventStreamRoleDelay"
+    ]
+
+
+def test_longest_dependency_chain(build):
+    """ Bucket -> DeliveryStream -> PinpointStreamPolicy -> Delay -> EventStream.
+        A longer chain means resources which used to be created in parallel are now
+        created one after another, slowing down every deployment.
+    """
+    graph = build_analytics(build, should_create_gtm_tag=False)
+
+    assert graph.longest_chain() == 5
+
+
+def test_firehose_role_policy(build):
+    graph = build_analytics(build, should_create_gtm_tag=False)
+
+    bucket_arn = f"arn:aws:mock:{REGION}:{ACCOUNT_ID}:TestBucket"
+    statements = graph.policy("TestDeliveryStreamPolicy")["Statement"]
+    actions = {action: s["Resource"] for s in statements for action in s["Action"]}
+
+    assert actions["s3:PutObject"] == [bucket_arn, f"{bucket_arn}/*"]
+    assert actions["logs:PutLogEvents"] == [
+        f"arn:aws:logs:{REGION}:{ACCOUNT_ID}:log-group:/aws/kinesisfirehose/"
+        "TestDeliveryStream:log-stream:*"
+    ]
+    assert not any(action.startswith("lambda:") for action in actions)
+
+
+def test_firehose_trust_policy(build):
+    graph = build_analytics(build, should_create_gtm_tag=False)
+
+    statement = graph.inputs("TestFirehoseRole")["assumeRolePolicy"]["Statement"][0]
+
+    assert statement["Principal"] == {"Service": "firehose.amazonaws.com"}
+    assert statement["Condition"] == {"StringEquals": {"sts:ExternalId": ACCOUNT_ID}}
+
+
+def test_pinpoint_stream_role_policy(build):
+    graph = build_analytics(build, should_create_gtm_tag=False)
+
+    statements = graph.policy("TestPinpointStreamPolicy")["Statement"]
+
+    assert statements[0]["Action"] == [
+        "firehose:PutRecordBatch",
+        "firehose:DescribeDeliveryStream",
+    ]
+    assert statements[0]["Resource"] == [
+        f"arn:aws:firehose:{REGION}:{ACCOUNT_ID}:deliverystream/TestDeliveryStream"
+    ]
+    assert (
+        f"arn:aws:mobiletargeting:*:{ACCOUNT_ID}:apps/TestPinpointApp-application-id"
+        in statements[1]["Resource"]
+    )
+
+
+def test_stream_sketches(build):
+    graph = build_analytics(
+        build, should_create_gtm_tag=False, should_create_stream_sketches=True
+    )
+
+    assert graph.names("nuage:aws:StreamSketches") == {"TestStreamSketches"}
+    assert "TestStreamSketchesFunction" in graph.dependencies("TestDeliveryStream")
+
+    processors = graph.inputs("TestDeliveryStream")["extendedS3Configuration"][
+        "processingConfiguration"
+    ]["processors"]
+    assert processors[0]["parameters"][0]["parameterValue"] == (
+        f"arn:aws:mock:{REGION}:{ACCOUNT_ID}:TestStreamSketchesFunction:$LATEST"
+    )
+
+    statements = graph.policy("TestDeliveryStreamPolicy")["Statement"]
+    assert statements[-1]["Action"] == [
+        "lambda:InvokeFunction",
+        "lambda:GetFunctionConfiguration",
+    ]
+
+
+def test_replica(build):
+    graph = build_analytics(
+        build, should_create_gtm_tag=False, replica_region="us-east-1"
+    )
+
+    assert graph.names("nuage:aws:LakeReplica") == {"TestReplica"}
+    assert graph.inputs("TestBucket")["versioning"] == {"enabled": True}
+    assert graph.get("TestBucket").ignore_changes == ["replicationConfiguration"]
+    for bucket in ["TestBucket", "TestReplicaBucket"]:
+        assert graph.inputs(bucket)["lifecycleRules"] == [
+            {"enabled": True, "noncurrentVersionExpiration": {"days": 30}}
+        ]
+    assert graph.inputs("TestReplicaProvider")["region"] == "us-east-1"
+    assert graph.dependencies("TestReplicaReplication") == {
+        "TestBucket",
+        "TestReplicaBucket",
+        "TestReplicaReplicationRole",
+        "TestReplicaReplicationPolicy",
+    }
+    assert "TestReplicaBucketPolicy" not in graph.names()
+
+    replication = graph.inputs("TestReplicaReplication")
+    assert replication["bucket"] == "TestBucket-id"
+    assert replication["region"] == REGION
+
+    table = graph.inputs("TestReplicaSessionsTable")
+    assert table["name"] == "sessions"
+    assert table["storageDescriptor"]["location"] == (
+        "s3://TestReplicaBucket-id/sessionization/sessions/"
+    )
+    assert table["partitionKeys"] == [{"name": "dt", "type": "string"}]
+
+
+def test_replication_uses_provider_settings(build, provider_settings):
+    graph = build_analytics(
+        build, should_create_gtm_tag=False, replica_region="us-east-1"
+    )
+
+    replication = graph.inputs("TestReplicaReplication")
+    assert replication["provider_settings"] == provider_settings
+
+
+def test_replica_prefix(build):
+    graph = build_analytics(
+        build,
+        should_create_gtm_tag=False,
+        replica_region="us-east-1",
+        replica_prefix="jobs/sessions-v2/",
+    )
+
+    rules = graph.inputs("TestReplicaReplication")["replication_configuration"]["Rules"]
+    assert [rule["Filter"] for rule in rules] == [
+        {"Prefix": "jobs/sessions-v2/sessions/"},
+        {"Prefix": "jobs/sessions-v2/funnel_steps/"},
+    ]
+    assert graph.inputs("TestReplicaFunnelStepsTable")["storageDescriptor"][
+        "location"
+    ] == ("s3://TestReplicaBucket-id/jobs/sessions-v2/funnel_steps/")
+
+
+def test_cross_account_replica_requires_provider(build):
+    with pytest.raises(Exception, match="replica_provider"):
+        build_analytics(
+            build,
+            should_create_gtm_tag=False,
+            replica_region="us-east-1",
+            replica_account_id="210987654321",
+        )
+
+
+def test_encryption(build):
+    graph = build_analytics(
+        build,
+        should_create_gtm_tag=False,
+        should_create_stream_sketches=True,
+        should_encrypt=True,
+    )
+
+    key_arn = f"arn:aws:mock:{REGION}:{ACCOUNT_ID}:TestKey"
+    assert graph.get("TestBucket").ignore_changes == [
+        "serverSideEncryptionConfiguration"
+    ]
+    assert graph.get("TestKey").type == "aws:kms/key:Key"
+    assert graph.inputs("TestKey")["enableKeyRotation"] is True
+    assert graph.policy("TestKey")["Statement"][0]["Principal"] == {
+        "AWS": f"arn:aws:iam::{ACCOUNT_ID}:root"
+    }
+
+    encryption = graph.inputs("TestBucketEncryption")
+    assert encryption["bucket"] == "TestBucket-id"
+    assert encryption["kms_key_arn"] == key_arn
+
+    stream = graph.inputs("TestDeliveryStream")
+    assert stream["serverSideEncryption"] == {"enabled": True}
+    assert "kmsKeyArn" not in stream["extendedS3Configuration"]
+    assert "TestBucketEncryption" in graph.dependencies("TestDeliveryStream")
+
+    statement = graph.policy("TestDeliveryStreamPolicy")["Statement"][-1]
+    assert statement["Resource"] == [key_arn]
+    assert statement["Condition"]["StringEquals"][
+        "kms:EncryptionContext:aws:s3:arn"
+    ] == (f"arn:aws:mock:{REGION}:{ACCOUNT_ID}:TestBucket")
+
+    statement = graph.policy("TestStreamSketchesPolicy")["Statement"][-1]
+    assert statement["Action"] == ["kms:GenerateDataKey"]
+    assert statement["Resource"] == [key_arn]
+
+
+def test_encryption_uses_provider_settings(build, provider_settings):
+    graph = build_analytics(build, should_create_gtm_tag=False, should_encrypt=True)
+
+    encryption = graph.inputs("TestBucketEncryption")
+    assert encryption["provider_settings"] == provider_settings
+
+
+def test_encryption_dependency_chain(build):
+    """ Key -> BucketEncryption -> DeliveryStream -> PinpointStreamPolicy -> Delay ->
+        EventStream.  The delivery stream waits for the bucket's default encryption so
+        that no objects are written unencrypted.
+    """
+    graph = build_analytics(build, should_create_gtm_tag=False, should_encrypt=True)
+
+    assert graph.longest_chain() == 6
+
+
+def test_encrypted_replica(build):
+    graph = build_analytics(
+        build,
+        should_create_gtm_tag=False,
+        replica_region="us-east-1",
+        should_encrypt=True,
+    )
+
+    assert graph.get("TestBucket").ignore_changes == [
+        "replicationConfiguration",
+        "serverSideEncryptionConfiguration",
+    ]
+
+    replica_key_arn = f"arn:aws:mock:{REGION}:{ACCOUNT_ID}:TestReplicaKey"
+    (statement,) = graph.policy("TestReplicaKey")["Statement"]
+    assert statement["Principal"] == {"AWS": f"arn:aws:iam::{ACCOUNT_ID}:root"}
+    assert (
+        graph.inputs("TestReplicaBucket")["serverSideEncryptionConfiguration"]["rule"][
+            "applyServerSideEncryptionByDefault"
+        ]["kmsMasterKeyId"]
+        == replica_key_arn
+    )
+    assert "TestReplicaReplicationKeyPolicy" in graph.dependencies(
+        "TestReplicaReplication"
+    )
+
+    rule = graph.inputs("TestReplicaReplication")["replication_configuration"]["Rules"][
+        0
+    ]
+    assert rule["Destination"]["EncryptionConfiguration"] == {
+        "ReplicaKmsKeyID": replica_key_arn
+    }
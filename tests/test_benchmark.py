@@ -0,0 +1,101 @@
+"""
+Benchmarks for building `Analytics` components against the mock engine.  Timings are
+compared with `benchmark_baseline.json` and fail when they regress by more than
+`BENCHMARK_TOLERANCE` (a fraction of the baseline, 1.0 by default because timings
+vary between machines).  To record a new baseline, run:
+
+    UPDATE_BENCHMARK_BASELINE=1 pytest -m benchmark
+"""
+
+import json
+import os
+import time
+
+import pytest
+from analytics import Analytics
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "benchmark_baseline.json")
+
+TOLERANCE = float(os.environ.get("BENCHMARK_TOLERANCE", "1.0"))
+
+UPDATE_BASELINE = os.environ.get("UPDATE_BENCHMARK_BASELINE") == "1"
+
+COMPONENT_COUNTS = [1, 10, 100]
+
+# The component itself and the nine AWS resources it creates without GTM
+RESOURCES_PER_COMPONENT = 10
+
+REPEATS = 3
+
+
+@pytest.fixture(scope="module")
+def baseline():
+    with open(BASELINE_PATH) as f:
+        timings = json.load(f)
+
+    yield timings
+
+    if UPDATE_BASELINE:
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(timings, f, indent=4, sort_keys=True)
+            f.write("\n")
+
+
+def time_program(build, count: int, preview: bool):
+    """ Returns the time taken for the component constructors to return, the total
+        time until every resource is registered, and the resulting graph.
+    """
+    timings = {}
+
+    def program():
+        started = time.perf_counter()
+        components = [
+            Analytics(f"Test{index}", should_create_gtm_tag=False)
+            for index in range(count)
+        ]
+        timings["construction"] = time.perf_counter() - started
+        return [component.bucket_name for component in components]
+
+    started = time.perf_counter()
+    graph = build(program, preview=preview)
+    return timings["construction"], time.perf_counter() - started, graph
+
+
+def check_timing(baseline, key: str, seconds: float):
+    if UPDATE_BASELINE:
+        baseline[key] = round(seconds, 4)
+        return
+
+    limit = baseline[key] * (1 + TOLERANCE)
+    assert seconds <= limit, (
+        f"{key} took {seconds:.3f}s, more than {limit:.3f}s "
+        f"(baseline {baseline[key]:.3f}s)"
+    )
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("count", COMPONENT_COUNTS)
+def test_program_benchmark(build, baseline, count):
+    runs = [time_program(build, count, preview=False) for _ in range(REPEATS)]
+
+    assert len(runs[0][2].resources) == count * RESOURCES_PER_COMPONENT
+    check_timing(baseline, f"construction_{count}", min(run[0] for run in runs))
+    check_timing(baseline, f"update_{count}", min(run[1] for run in runs))
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("count", COMPONENT_COUNTS)
+def test_preview_benchmark(build, baseline, count):
+    runs = [time_program(build, count, preview=True) for _ in range(REPEATS)]
+
+    assert len(runs[0][2].resources) == count * RESOURCES_PER_COMPONENT
+    check_timing(baseline, f"preview_{count}", min(run[1] for run in runs))
+
+
+@pytest.mark.benchmark
+def test_preview_scales_linearly(build):
+    """ Unlike the absolute timings, this does not depend on the machine """
+    _, small, _ = time_program(build, 10, preview=True)
+    _, large, _ = time_program(build, 100, preview=True)
+
+    assert large / 100 <= (small / 10) * (1 + TOLERANCE)
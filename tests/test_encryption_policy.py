@@ -0,0 +1,178 @@
+from encryption_policy import get_bucket_key_policy_statement, get_key_policy_document
+from firehose_policy import get_firehose_role_policy_document
+from pulumi import Output
+from replication_policy import (
+    get_replication_configuration,
+    get_replication_role_key_policy_document,
+)
+from sessionization_policy import get_sessionization_role_policy_document
+from sketch_policy import get_stream_sketches_role_policy_document
+
+ACCOUNT_ID = "123456789012"
+
+REGION = "eu-west-1"
+
+BUCKET_ARN = "arn:aws:s3:::analytics"
+
+KEY_ARN = f"arn:aws:kms:{REGION}:{ACCOUNT_ID}:key/analytics"
+
+REPLICA_REGION = "us-east-1"
+
+REPLICA_ARN = "arn:aws:s3:::analytics-replica"
+
+REPLICA_KEY_ARN = f"arn:aws:kms:{REPLICA_REGION}:{ACCOUNT_ID}:key/replica"
+
+ROLE_ARN = "arn:aws:iam::210987654321:role/replication"
+
+BUCKET_KEY_CONDITION = {
+    "StringEquals": {
+        "kms:ViaService": f"s3.{REGION}.amazonaws.com",
+        "kms:EncryptionContext:aws:s3:arn": BUCKET_ARN,
+    }
+}
+
+
+def kms_statements(policy):
+    return [
+        statement
+        for statement in policy["Statement"]
+        if any(action.startswith("kms:") for action in statement["Action"])
+    ]
+
+
+def test_key_policy_delegates_to_iam(resolve):
+    policy = resolve(lambda: get_key_policy_document(ACCOUNT_ID))
+
+    (statement,) = policy["Statement"]
+    assert statement["Principal"] == {"AWS": f"arn:aws:iam::{ACCOUNT_ID}:root"}
+    assert statement["Action"] == "kms:*"
+
+
+def test_key_policy_with_account_output(resolve):
+    policy = resolve(lambda: get_key_policy_document(Output.from_input(ACCOUNT_ID)))
+
+    (statement,) = policy["Statement"]
+    assert statement["Principal"] == {"AWS": f"arn:aws:iam::{ACCOUNT_ID}:root"}
+
+
+def test_key_policy_with_key_user(resolve):
+    policy = resolve(
+        lambda: get_key_policy_document(
+            ACCOUNT_ID, Output.from_input(ROLE_ARN), REPLICA_REGION
+        )
+    )
+
+    root, user = policy["Statement"]
+    assert user["Principal"] == {"AWS": ROLE_ARN}
+    assert "kms:*" not in user["Action"]
+    assert user["Condition"] == {
+        "StringEquals": {"kms:ViaService": f"s3.{REPLICA_REGION}.amazonaws.com"}
+    }
+
+
+def test_bucket_key_statement():
+    statement = get_bucket_key_policy_statement(
+        REGION, KEY_ARN, BUCKET_ARN, ["kms:Decrypt"]
+    )
+
+    assert statement["Resource"] == [KEY_ARN]
+    assert statement["Condition"] == BUCKET_KEY_CONDITION
+
+
+def test_firehose_role_grant(resolve):
+    policy = resolve(
+        lambda: get_firehose_role_policy_document(
+            REGION,
+            ACCOUNT_ID,
+            Output.from_input(BUCKET_ARN),
+            Output.from_input("stream"),
+            kmsKeyArnOutput=Output.from_input(KEY_ARN),
+        )
+    )
+
+    (statement,) = kms_statements(policy)
+    assert statement["Action"] == ["kms:Decrypt", "kms:GenerateDataKey"]
+    assert statement["Resource"] == [KEY_ARN]
+    assert statement["Condition"] == BUCKET_KEY_CONDITION
+
+
+def test_firehose_role_without_key(resolve):
+    policy = resolve(
+        lambda: get_firehose_role_policy_document(
+            REGION, ACCOUNT_ID, Output.from_input(BUCKET_ARN), Output.from_input("s")
+        )
+    )
+
+    assert kms_statements(policy) == []
+
+
+def test_stream_sketches_grant(resolve):
+    policy = resolve(
+        lambda: get_stream_sketches_role_policy_document(
+            Output.from_input(BUCKET_ARN),
+            "sketches/",
+            REGION,
+            Output.from_input(KEY_ARN),
+        )
+    )
+
+    (statement,) = kms_statements(policy)
+    assert statement["Action"] == ["kms:GenerateDataKey"]
+    assert statement["Condition"] == BUCKET_KEY_CONDITION
+
+
+def test_sessionization_grant(resolve):
+    policy = resolve(
+        lambda: get_sessionization_role_policy_document(
+            Output.from_input(BUCKET_ARN),
+            "sessionization/",
+            REGION,
+            Output.from_input(KEY_ARN),
+        )
+    )
+
+    (statement,) = kms_statements(policy)
+    assert statement["Action"] == ["kms:Decrypt", "kms:GenerateDataKey"]
+    assert statement["Condition"] == BUCKET_KEY_CONDITION
+
+
+def test_replication_role_grants(resolve):
+    policy = resolve(
+        lambda: get_replication_role_key_policy_document(
+            REGION,
+            Output.from_input(BUCKET_ARN),
+            Output.from_input(KEY_ARN),
+            REPLICA_REGION,
+            Output.from_input(REPLICA_ARN),
+            Output.from_input(REPLICA_KEY_ARN),
+            ["sessionization/sessions/"],
+        )
+    )
+
+    decrypt, encrypt = policy["Statement"]
+    assert decrypt["Action"] == ["kms:Decrypt"]
+    assert decrypt["Condition"] == BUCKET_KEY_CONDITION
+    assert encrypt["Action"] == ["kms:Encrypt"]
+    assert encrypt["Resource"] == [REPLICA_KEY_ARN]
+    assert encrypt["Condition"]["StringLike"] == {
+        "kms:EncryptionContext:aws:s3:arn": [f"{REPLICA_ARN}/sessionization/sessions/*"]
+    }
+
+
+def test_encrypted_replication_configuration(resolve):
+    configuration = resolve(
+        lambda: get_replication_configuration(
+            Output.from_input(ROLE_ARN),
+            Output.from_input(REPLICA_ARN),
+            ["sessionization/sessions/"],
+            replica_key_arn=Output.from_input(REPLICA_KEY_ARN),
+        )
+    )
+
+    (rule,) = configuration["Rules"]
+    assert rule["SourceSelectionCriteria"] == {
+        "SseKmsEncryptedObjects": {"Status": "Enabled"}
+    }
+    assert rule["Destination"]["EncryptionConfiguration"] == {
+        "ReplicaKmsKeyID": REPLICA_KEY_ARN
+    }
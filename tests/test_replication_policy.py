@@ -0,0 +1,109 @@
+from pulumi import Output
+from replication_policy import (
+    get_replica_bucket_policy_document,
+    get_replication_configuration,
+    get_replication_role_policy_document,
+    get_replication_role_trust_policy_document,
+)
+
+SOURCE_ARN = "arn:aws:s3:::analytics"
+
+REPLICA_ARN = "arn:aws:s3:::analytics-replica"
+
+ROLE_ARN = "arn:aws:iam::123456789012:role/replication"
+
+PREFIXES = ["sessionization/sessions/", "sessionization/funnel_steps/"]
+
+
+def test_trust_policy():
+    statement = get_replication_role_trust_policy_document()["Statement"][0]
+
+    assert statement["Principal"] == {"Service": "s3.amazonaws.com"}
+    assert statement["Action"] == "sts:AssumeRole"
+
+
+def test_role_policy_is_limited_to_prefix(resolve):
+    policy = resolve(
+        lambda: get_replication_role_policy_document(
+            Output.from_input(SOURCE_ARN), Output.from_input(REPLICA_ARN), PREFIXES
+        )
+    )
+
+    source, read, replicate = policy["Statement"]
+    assert source["Resource"] == [SOURCE_ARN]
+    assert read["Resource"] == [
+        f"{SOURCE_ARN}/sessionization/sessions/*",
+        f"{SOURCE_ARN}/sessionization/funnel_steps/*",
+    ]
+    assert replicate["Resource"] == [
+        f"{REPLICA_ARN}/sessionization/sessions/*",
+        f"{REPLICA_ARN}/sessionization/funnel_steps/*",
+    ]
+    assert "s3:ObjectOwnerOverrideToBucketOwner" not in replicate["Action"]
+
+
+def test_cross_account_role_policy(resolve):
+    policy = resolve(
+        lambda: get_replication_role_policy_document(
+            Output.from_input(SOURCE_ARN),
+            Output.from_input(REPLICA_ARN),
+            PREFIXES,
+            replica_account_id="210987654321",
+        )
+    )
+
+    assert "s3:ObjectOwnerOverrideToBucketOwner" in policy["Statement"][2]["Action"]
+
+
+def test_replica_bucket_policy(resolve):
+    policy = resolve(
+        lambda: get_replica_bucket_policy_document(
+            Output.from_input(REPLICA_ARN), Output.from_input(ROLE_ARN), PREFIXES
+        )
+    )
+
+    for statement in policy["Statement"]:
+        assert statement["Principal"] == {"AWS": ROLE_ARN}
+    assert policy["Statement"][1]["Resource"] == [
+        f"{REPLICA_ARN}/sessionization/sessions/*",
+        f"{REPLICA_ARN}/sessionization/funnel_steps/*",
+    ]
+
+
+def test_replication_configuration(resolve):
+    configuration = resolve(
+        lambda: get_replication_configuration(
+            Output.from_input(ROLE_ARN), Output.from_input(REPLICA_ARN), PREFIXES
+        )
+    )
+
+    assert configuration["Role"] == ROLE_ARN
+    assert [rule["Filter"] for rule in configuration["Rules"]] == [
+        {"Prefix": prefix} for prefix in PREFIXES
+    ]
+    assert [rule["Priority"] for rule in configuration["Rules"]] == [1, 2]
+    rule = configuration["Rules"][0]
+    assert rule["ID"] == "Replicate-sessionization-sessions"
+    assert rule["Destination"]["Bucket"] == REPLICA_ARN
+    assert rule["Destination"]["ReplicationTime"] == {
+        "Status": "Enabled",
+        "Time": {"Minutes": 15},
+    }
+    assert rule["Destination"]["Metrics"]["Status"] == "Enabled"
+    assert "AccessControlTranslation" not in rule["Destination"]
+    assert "SourceSelectionCriteria" not in rule
+
+
+def test_cross_account_replication_configuration(resolve):
+    configuration = resolve(
+        lambda: get_replication_configuration(
+            Output.from_input(ROLE_ARN),
+            Output.from_input(REPLICA_ARN),
+            PREFIXES,
+            replica_account_id="210987654321",
+        )
+    )
+
+    destination = configuration["Rules"][0]["Destination"]
+    assert destination["Account"] == "210987654321"
+    assert destination["AccessControlTranslation"] == {"Owner": "Destination"}
@@ -0,0 +1,196 @@
+import io
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pytest
+from object_store import LocalStore
+from sessionizer import (
+    JobConfig,
+    compute_funnel_steps,
+    find_first_partition,
+    generate_synthetic_events,
+    run,
+    sessionize,
+    write_synthetic_partitions,
+)
+
+START = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+HOURS = 8
+
+FUNNEL_STEPS = [
+    {"name": "Pageview", "analytics_event": "gtm.js"},
+    {"name": "Search", "analytics_event": "search"},
+]
+
+# Late enough for every synthetic partition, and no later one, to have settled
+NOW = START + timedelta(hours=HOURS, minutes=30)
+
+
+class FailingStore(LocalStore):
+    """ A store whose writes to one key fail a given number of times """
+
+    def __init__(self, root: str, failing_key: str, failures: int):
+        super().__init__(root)
+        self.failing_key = failing_key
+        self.failures = failures
+
+    def write(self, key: str, body: bytes):
+        if key == self.failing_key and self.failures > 0:
+            self.failures -= 1
+            raise Exception(f"Failed to write {key}")
+        super().write(key, body)
+
+
+def create_store(path, store_class=LocalStore, **kwargs):
+    store = store_class(str(path), **kwargs)
+    write_synthetic_partitions(
+        store, generate_synthetic_events(START, HOURS, endpoints=50)
+    )
+    return store
+
+
+def read_table(store, config: JobConfig, table: str, sort_columns):
+    keys = store.list_keys(f"{config.output_prefix}{table}/")
+    frame = pd.concat(
+        [pd.read_parquet(io.BytesIO(store.read(key))) for key in keys],
+        ignore_index=True,
+    )
+    return frame.sort_values(sort_columns).reset_index(drop=True)
+
+
+def read_tables(store, config: JobConfig):
+    return (
+        read_table(store, config, "sessions", ["session_id"]),
+        read_table(store, config, "funnel_steps", ["session_id", "step_index"]),
+    )
+
+
+def run_until_caught_up(store, config: JobConfig):
+    runs = 0
+    while run(store, config, NOW)["partitions"]:
+        runs += 1
+    return runs
+
+
+@pytest.fixture
+def one_pass(tmp_path):
+    store = create_store(tmp_path / "one_pass")
+    config = JobConfig(funnel_steps=FUNNEL_STEPS)
+    result = run(store, config, NOW)
+
+    assert len(result["partitions"]) == HOURS
+    return read_tables(store, config)
+
+
+def assert_tables_equal(actual, expected):
+    for actual_table, expected_table in zip(actual, expected):
+        pd.testing.assert_frame_equal(actual_table, expected_table)
+
+
+def test_hourly_runs_match_one_pass(tmp_path, one_pass):
+    store = create_store(tmp_path / "hourly")
+    config = JobConfig(funnel_steps=FUNNEL_STEPS, max_partitions=1)
+
+    assert run_until_caught_up(store, config) == HOURS
+    assert_tables_equal(read_tables(store, config), one_pass)
+
+
+def test_retry_after_failed_watermark_write(tmp_path, one_pass):
+    config = JobConfig(funnel_steps=FUNNEL_STEPS, max_partitions=3)
+    store = create_store(
+        tmp_path / "retry", FailingStore, failing_key=config.watermark_key, failures=0
+    )
+
+    run(store, config, NOW - timedelta(hours=3))
+    store.failures = 1
+    with pytest.raises(Exception, match="watermark"):
+        run(store, config, NOW)
+
+    run_until_caught_up(store, config)
+
+    assert_tables_equal(read_tables(store, config), one_pass)
+    assert len(store.list_keys(f"{config.output_prefix}_state/pending")) == 1
+
+
+def test_sessions_of_skewed_clients_close(tmp_path):
+    # The last partition is empty, so every session has closed by the last run
+    records = generate_synthetic_events(START, HOURS - 1, endpoints=5)
+    expected = LocalStore(str(tmp_path / "expected"))
+    write_synthetic_partitions(expected, records)
+    for record in records:
+        record["event_timestamp"] += int(timedelta(days=1).total_seconds() * 1000)
+    skewed = LocalStore(str(tmp_path / "skewed"))
+    write_synthetic_partitions(skewed, records)
+    config = JobConfig(max_partitions=3)
+
+    results = [run(skewed, config, NOW) for _ in range(3)]
+
+    assert [len(result["partitions"]) for result in results] == [3, 3, 2]
+    assert results[-1]["pending_events"] == 0
+    assert sum(result["sessions"] for result in results) == sum(
+        result["sessions"] for result in [run(expected, config, NOW) for _ in range(3)]
+    )
+
+
+def test_run_without_new_partitions(tmp_path):
+    store = create_store(tmp_path)
+    config = JobConfig()
+
+    assert run(store, config, START)["partitions"] == []
+    assert store.read(config.watermark_key) is None
+
+
+def test_find_first_partition(tmp_path):
+    store = LocalStore(str(tmp_path))
+    assert find_first_partition(store) is None
+
+    store.write("2020/02/01/05/events.gz", b"")
+    store.write("2020/01/31/23/events.gz", b"")
+    store.write("sessionization/_state/watermark.json", b"{}")
+
+    assert find_first_partition(store) == "2020/01/31/23"
+
+
+def create_events(rows):
+    return pd.DataFrame(
+        {
+            "endpoint_id": [row[0] for row in rows],
+            "pinpoint_session_id": None,
+            "analytics_event": [row[1] for row in rows],
+            "event_time": pd.to_datetime(
+                [START + timedelta(minutes=row[2]) for row in rows], utc=True
+            ),
+            "page_path": "/",
+            "referrer": None,
+        }
+    )
+
+
+def test_sessionize_splits_on_inactivity():
+    events = sessionize(
+        create_events([("a", "gtm.js", 0), ("a", "gtm.js", 20), ("a", "gtm.js", 51)]),
+        pd.Timedelta(minutes=30),
+    )
+
+    assert events["session_id"].nunique() == 2
+    assert events["session_id"].iloc[0] == events["session_id"].iloc[1]
+
+
+def test_funnel_steps_are_reached_in_order():
+    events = sessionize(
+        create_events(
+            [
+                ("a", "search", 0),
+                ("a", "gtm.js", 1),
+                ("b", "gtm.js", 0),
+                ("b", "search", 1),
+            ]
+        ),
+        pd.Timedelta(minutes=30),
+    )
+
+    steps = compute_funnel_steps(events, FUNNEL_STEPS)
+
+    reached = steps.groupby("endpoint_id")["step_name"].apply(list).to_dict()
+    assert reached == {"a": ["Pageview"], "b": ["Pageview", "Search"]}
@@ -0,0 +1,128 @@
+import base64
+import json
+import random
+from datetime import datetime, timedelta, timezone
+
+from object_store import LocalStore
+from sketches import (
+    WindowSketch,
+    get_snapshot_id,
+    load_windows,
+    merge_windows,
+    sketch_events,
+    transform,
+    write_snapshots,
+)
+
+START = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+
+def generate_events(count: int, minutes: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [
+        {
+            "event_type": f"event_{rng.randrange(5)}",
+            "arrival_timestamp": int(
+                (START + timedelta(seconds=rng.uniform(0, 60 * minutes))).timestamp()
+                * 1000
+            ),
+            "client": {"client_id": f"endpoint-{rng.randrange(500)}"},
+            "attributes": {"page_path": f"/page/{int(rng.paretovariate(1)) % 20}"},
+        }
+        for _ in range(count)
+    ]
+
+
+def create_records(events):
+    body = "\n".join(json.dumps(event) for event in events).encode()
+    return [{"recordId": "record-0", "data": base64.b64encode(body).decode()}]
+
+
+def assert_sketches_equal(actual: WindowSketch, expected: WindowSketch):
+    assert actual.event_count == expected.event_count
+    assert actual.unique_endpoints.registers == expected.unique_endpoints.registers
+    for attribute in ["page_paths", "analytics_events"]:
+        actual_top, expected_top = (
+            getattr(actual, attribute),
+            getattr(expected, attribute),
+        )
+        assert actual_top.sketch.counts == expected_top.sketch.counts
+        assert actual_top.top() == expected_top.top()
+
+
+def test_merged_halves_match_whole_stream():
+    events = generate_events(2000, minutes=10)
+
+    whole = merge_windows(sketch_events(events).values())
+    halves = merge_windows(
+        [
+            *sketch_events(events[:1000]).values(),
+            *sketch_events(events[1000:]).values(),
+        ]
+    )
+
+    assert_sketches_equal(halves, whole)
+    assert whole.event_count == 2000
+
+
+def test_snapshot_round_trip():
+    (window,) = sketch_events(generate_events(100, minutes=1)).values()
+
+    assert_sketches_equal(WindowSketch.from_bytes(window.to_bytes()), window)
+
+
+def test_load_windows_keeps_requested_range(tmp_path):
+    store = LocalStore(str(tmp_path))
+    windows = sketch_events(generate_events(500, minutes=90))
+    write_snapshots(store, windows, "sketches/", "first")
+    write_snapshots(store, windows, "sketches/", "second")
+
+    assert "sketches/2020/01/01/00/05/first.sketch" in store.list_keys("sketches/")
+
+    start, end = START + timedelta(minutes=30), START + timedelta(minutes=70)
+    loaded = load_windows(store, start, end)
+
+    expected = {minute for minute in windows if start <= minute < end}
+    assert set(loaded) == expected
+    for minute in expected:
+        assert loaded[minute].event_count == 2 * windows[minute].event_count
+
+
+def test_transform_returns_records_unchanged(tmp_path):
+    store = LocalStore(str(tmp_path))
+    records = create_records(generate_events(50, minutes=2))
+    records.append({"recordId": "record-1", "data": base64.b64encode(b"{").decode()})
+
+    result = transform(store, records, "sketches/")
+
+    assert result["records"] == [
+        {"recordId": record["recordId"], "result": "Ok", "data": record["data"]}
+        for record in records
+    ]
+    assert store.list_keys("sketches/")
+
+
+def test_retried_batch_overwrites_its_snapshot(tmp_path):
+    store = LocalStore(str(tmp_path))
+    records = create_records(generate_events(50, minutes=2))
+
+    transform(store, records, "sketches/")
+    keys = store.list_keys("sketches/")
+    transform(store, records, "sketches/")
+
+    assert store.list_keys("sketches/") == keys
+    assert get_snapshot_id(records) in keys[0]
+
+
+class FailingStore(LocalStore):
+    def write(self, key: str, body: bytes):
+        raise Exception("Access denied")
+
+
+def test_transform_passes_records_when_snapshots_fail(tmp_path):
+    records = create_records(generate_events(50, minutes=2))
+
+    result = transform(FailingStore(str(tmp_path)), records, "sketches/")
+
+    assert [record["result"] for record in result["records"]] == ["Ok"]
+    assert result["records"][0]["data"] == records[0]["data"]